@@ -0,0 +1,38 @@
+"""get_message() in a loop vs batched render_messages().
+
+Usage: python benchmarks/bench_format.py [messages]
+"""
+import io
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import homework  # noqa: E402
+
+
+def main(count):
+    infos = [homework.InfoMessage('Running', 1 + i % 5, 9.75, 9.75, 699.75)
+             for i in range(count)]
+
+    def loop():
+        stream = io.StringIO()
+        for info in infos:
+            stream.write(info.get_message() + '\n')
+        return stream.getvalue()
+
+    def batched():
+        stream = io.StringIO()
+        homework.write_messages(infos, stream)
+        return stream.getvalue()
+
+    assert loop() == batched()
+    loop_time = min(timeit.repeat(loop, number=1, repeat=5))
+    batch_time = min(timeit.repeat(batched, number=1, repeat=5))
+    print(f'{count} messages: get_message loop {loop_time:.3f}s, '
+          f'batched {batch_time:.3f}s, x{loop_time / batch_time:.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,124 @@
+"""Benchmarks of every hot path of homework.py.
+
+Usage:
+    python benchmarks/bench_homework.py [--sizes 1 1000 1000000]
+        [--output results.json] [--baseline saved.json] [--threshold 0.2]
+
+Results are nanoseconds per record, keyed by benchmark and size. With
+`--baseline` the run exits with status 1 if any benchmark got slower
+than the baseline by more than `--threshold` (a fraction).
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import homework  # noqa: E402
+
+PACKAGES = {
+    'SWM': [720, 1, 80, 25, 40],
+    'RUN': [15000, 1, 75],
+    'WLK': [9000, 1, 75, 180],
+}
+
+
+def timed(run, size, repeat):
+    """Best time per record in nanoseconds of `run()` over `size` items."""
+
+    best = min(_once(run) for _ in range(repeat))
+    return best * 1e9 / size
+
+
+def _once(run):
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def cases(size):
+    """Yield `(name, setup)` pairs; setup returns the function to time."""
+
+    for code, data in PACKAGES.items():
+        workout_class = homework.WORKOUTS[code].workout_class
+        name = workout_class.__name__
+        rows = [list(data) for _ in range(size)]
+
+        yield f'read_package[{code}]', lambda code=code, rows=rows: (
+            lambda: [homework.read_package(code, row) for row in rows]
+        )
+        yield f'construct[{name}]', lambda cls=workout_class, rows=rows: (
+            lambda: [cls(*row) for row in rows]
+        )
+
+        def calories(cls=workout_class, rows=rows):
+            trainings = [cls(*row) for row in rows]
+            return lambda: [t.get_spent_calories() for t in trainings]
+        yield f'get_spent_calories[{name}]', calories
+
+        def info(cls=workout_class, rows=rows):
+            trainings = [cls(*row) for row in rows]
+            return lambda: [t.show_training_info() for t in trainings]
+        yield f'show_training_info[{name}]', info
+
+    infos = [homework.InfoMessage('Running', 1, 9.75, 9.75, 699.75)
+             for _ in range(size)]
+    yield 'get_message', lambda: (
+        lambda: [info.get_message() for info in infos]
+    )
+
+
+def run(sizes):
+    results = {}
+    for size in sizes:
+        repeat = 1 if size >= 100000 else 5
+        for name, setup in cases(size):
+            # Cached metrics must not leak between repeats
+            results.setdefault(name, {})[str(size)] = min(
+                timed(setup(), size, 1) for _ in range(repeat)
+            )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List `(name, size, ratio)` of benchmarks slower than the baseline."""
+
+    regressions = []
+    for name, by_size in results.items():
+        for size, value in by_size.items():
+            saved = baseline.get(name, {}).get(size)
+            if saved and value / saved > 1 + threshold:
+                regressions.append((name, size, value / saved))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1, 1000, 1000000])
+    parser.add_argument('--output', help='write results as JSON here')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        for name, size, ratio in regressions:
+            print(f'REGRESSION {name} @ {size}: x{ratio:.2f}',
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Bytes per session: list of Training objects vs TrainingTable.
+
+Usage: python benchmarks/bench_memory.py [sessions]
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import homework  # noqa: E402
+
+PACKAGES = {
+    'SWM': [720, 1.0, 80.0, 25, 40],
+    'RUN': [15000, 1.0, 75.0],
+    'WLK': [9000, 1.0, 75.0, 180],
+}
+
+
+def measure(build):
+    """Return the number of bytes still allocated by `build()`."""
+
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(sessions):
+    print(f'{sessions} sessions per workout type')
+    for workout_type, data in PACKAGES.items():
+        workout_class = homework.WORKOUTS[workout_type].workout_class
+        rows = [[value + i % 7 for value in data] for i in range(sessions)]
+        objects = measure(lambda: [workout_class(*row) for row in rows])
+        table = measure(lambda: homework.TrainingTable(workout_type, rows))
+        print(f'{workout_class.__name__:>14}: '
+              f'objects {objects / sessions:7.1f} B/session, '
+              f'table {table / sessions:7.1f} B/session')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
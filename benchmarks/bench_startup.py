@@ -0,0 +1,35 @@
+"""Import time of homework.py, as reported by `python -X importtime`.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def import_time():
+    """Cumulative import time of `homework` in microseconds."""
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import homework'],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    for line in result.stderr.splitlines():
+        _, _, cumulative, name = (part.strip() for part in
+                                  line.replace(':', '|', 1).split('|'))
+        if name == 'homework':
+            return int(cumulative)
+    raise RuntimeError('homework is missing from the importtime report')
+
+
+def main(runs):
+    times = sorted(import_time() for _ in range(runs))
+    print(f'import homework: best {times[0] / 1000:.1f} ms, '
+          f'median {times[len(times) // 2] / 1000:.1f} ms '
+          f'over {runs} runs')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
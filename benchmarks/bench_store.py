@@ -0,0 +1,39 @@
+"""Ingest rate of SessionStore.
+
+Usage: python benchmarks/bench_store.py [sessions]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import homework  # noqa: E402
+
+
+def main(count):
+    infos = [homework.read_package(*package).show_training_info()
+             for package in homework.SAMPLE_PACKAGES]
+    sessions = [(f'user{index % 1000}', float(index),
+                 infos[index % len(infos)]) for index in range(count)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sessions.db')
+        with homework.SessionStore(path) as store:
+            started = time.perf_counter()
+            store.add_many(sessions)
+            elapsed = time.perf_counter() - started
+
+            query_started = time.perf_counter()
+            totals = store.aggregate(training_type='Running',
+                                     start=0, end=count / 2)
+            query_elapsed = time.perf_counter() - query_started
+    print(f'ingest {count} sessions: {elapsed:.2f}s, '
+          f'{count / elapsed:,.0f} sessions/s')
+    print(f'aggregate over {totals.count} sessions: '
+          f'{query_elapsed * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -1,8 +1,145 @@
-from typing import Dict, Type
-from dataclasses import dataclass
+# Keep the import cheap: subsystems import their modules (asyncio,
+# sqlite3, multiprocessing, numpy, ...) on first use, and annotations
+# are never evaluated.
+from __future__ import annotations
+
+import atexit
+import math
+import os
+import sys
+import time
+import weakref
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import MISSING, asdict, dataclass, field, fields
+from functools import wraps
+from itertools import chain, islice, repeat
+from operator import attrgetter
+from typing import (TYPE_CHECKING, Any, Callable, Dict, IO, Iterable,
+                    Iterator, List, Mapping, Optional, Sequence, Tuple,
+                    Union)
+
+if TYPE_CHECKING:  # pragma: no cover - only for annotations
+    import asyncio
+    import struct
 
 MINS_IN_HOUR = 60
 
+_numpy_module: Any = ...
+
+
+def numpy() -> Any:
+    """NumPy, imported on first use, or None if it is not installed."""
+
+    global _numpy_module
+    if _numpy_module is ...:
+        try:
+            import numpy as np
+        except ImportError:  # pragma: no cover - numpy is optional
+            np = None
+        _numpy_module = np
+    return _numpy_module
+
+
+class PackageError(ValueError):
+    """A sensor package that can not be turned into a training."""
+
+    def __init__(self, workout_type: str, message: str) -> None:
+        super().__init__(workout_type, message)
+        self.workout_type = workout_type
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class UnknownWorkoutError(PackageError, KeyError):
+    """A package with a workout code nobody has registered."""
+
+
+@dataclass
+class Workout:
+    """Registry entry of a workout type."""
+
+    code: str
+    workout_class: type
+    field_names: Tuple[str, ...]
+    kernel: Optional[Callable] = None
+    # Whether instances can be filled in without calling __init__
+    direct: bool = True
+
+    @property
+    def arity(self) -> int:
+        """Number of data elements in a package of this type."""
+
+        return len(self.field_names)
+
+    def build(self, data: Sequence) -> 'Training':
+        """Create a training from data of the right length.
+
+        Plain dataclasses are filled in directly, skipping the call of
+        the generated __init__."""
+
+        workout_class = self.workout_class
+        if not self.direct:
+            return workout_class(*data)
+        training = workout_class.__new__(workout_class)
+        training.__dict__.update(zip(self.field_names, data))
+        return training
+
+
+# Workout code from fitness-module -> workout type
+WORKOUTS: Dict[str, Workout] = {}
+
+
+def register_workout(code: str) -> Callable[[type], type]:
+    """Class decorator registering a Training dataclass under `code`.
+
+    Apply it on top of `@dataclass`. Batch kernels are attached
+    separately with `register_kernel`."""
+
+    def register(workout_class: type) -> type:
+        WORKOUTS[code] = Workout(
+            code, workout_class,
+            tuple(item.name for item in fields(workout_class)
+                  if item.init),
+            direct=_fills_directly(workout_class)
+        )
+        return workout_class
+
+    return register
+
+
+def _fills_directly(workout_class: type) -> bool:
+    """Whether skipping __init__ gives the same instance as calling it.
+
+    True for plain dataclasses: every field is an init argument without
+    a default, __init__ is the generated one, there is no __post_init__
+    and no field is shadowed by a descriptor."""
+
+    init = getattr(workout_class.__init__, '__code__', None)
+    if (init is None or init.co_filename != '<string>'
+            or hasattr(workout_class, '__post_init__')):
+        return False
+    for item in fields(workout_class):
+        if not item.init or item.default_factory is not MISSING:
+            return False
+        if hasattr(getattr(workout_class, item.name, None), '__set__'):
+            return False
+    return True
+
+
+def get_workout(workout_type: str) -> Workout:
+    """Registry entry of a code, UnknownWorkoutError if there is none."""
+
+    workout = WORKOUTS.get(workout_type)
+    if workout is None:
+        raise UnknownWorkoutError(
+            workout_type,
+            f'Sorry. <{workout_type}> is undefined workout type.'
+        )
+    return workout
+
 
 @dataclass
 class InfoMessage:
@@ -33,6 +170,7 @@ class Training:
 
     LEN_STEP = 0.65  # meters in one step
     M_IN_KM = 1000  # meters in one kilometer
+    MAX_SPEED = float('inf')  # km/h, faster sessions are implausible
 
     action: int
     duration: float
@@ -46,7 +184,10 @@ class Training:
     def get_mean_speed(self) -> float:
         """Get average moving speed."""
 
-        return self.get_distance() / self.duration
+        return self._mean_speed(self.get_distance())
+
+    def _mean_speed(self, distance: float) -> float:
+        return distance / self.duration
 
     def get_spent_calories(self):
         """Get calories spent during a workout.
@@ -57,22 +198,30 @@ class Training:
                                   % type(self).__name__
                                   )
 
+    def _spent_calories(self, speed: float) -> float:
+        # Subclasses reuse the speed computed by show_training_info
+        return self.get_spent_calories()
+
     def show_training_info(self) -> InfoMessage:
         """Retrieve info message about completed training."""
 
+        distance = self.get_distance()
+        speed = self._mean_speed(distance)
         return InfoMessage(type(self).__name__,
                            self.duration,
-                           self.get_distance(),
-                           self.get_mean_speed(),
-                           self.get_spent_calories())
+                           distance,
+                           speed,
+                           self._spent_calories(speed))
 
 
+@register_workout('RUN')
 @dataclass
 class Running(Training):
     """Training type: running."""
 
     RUN_CAL_COEFF_1 = 18
     RUN_CAL_COEFF_2 = 20
+    MAX_SPEED = 40
 
     action: int
     duration: float
@@ -81,7 +230,10 @@ class Running(Training):
     def get_spent_calories(self) -> float:
         """Count calories burnt during the session."""
 
-        return ((self.RUN_CAL_COEFF_1 * self.get_mean_speed()
+        return self._spent_calories(self.get_mean_speed())
+
+    def _spent_calories(self, speed: float) -> float:
+        return ((self.RUN_CAL_COEFF_1 * speed
                 - self.RUN_CAL_COEFF_2)
                 * self.weight
                 / self.M_IN_KM
@@ -89,6 +241,7 @@ class Running(Training):
                 )
 
 
+@register_workout('WLK')
 @dataclass
 class SportsWalking(Training):
     """Training type: sport walking."""
@@ -96,6 +249,7 @@ class SportsWalking(Training):
     WALK_CAL_COEFF_1 = 0.035
     WALK_CAL_COEFF_2 = 2
     WALK_CAL_COEFF_3 = 0.029
+    MAX_SPEED = 15
 
     action: int
     duration: float
@@ -105,13 +259,17 @@ class SportsWalking(Training):
     def get_spent_calories(self) -> float:
         """Count calories burnt during the session."""
 
+        return self._spent_calories(self.get_mean_speed())
+
+    def _spent_calories(self, speed: float) -> float:
         return ((self.WALK_CAL_COEFF_1 * self.weight
-                + (self.get_mean_speed()**self.WALK_CAL_COEFF_2 // self.height)
+                + (speed**self.WALK_CAL_COEFF_2 // self.height)
                 * self.WALK_CAL_COEFF_3 * self.weight)
                 * self.duration * MINS_IN_HOUR
                 )
 
 
+@register_workout('SWM')
 @dataclass
 class Swimming(Training):
     """Training type: swimming."""
@@ -119,6 +277,7 @@ class Swimming(Training):
     LEN_STEP = 1.38  # meters in one stroke
     SWM_CAL_COEFF_1 = 1.1
     SWM_CAL_COEFF_2 = 2
+    MAX_SPEED = 10
 
     action: int
     duration: float
@@ -135,62 +294,2709 @@ class Swimming(Training):
                 / self.duration
                 )
 
+    def _mean_speed(self, distance: float) -> float:
+        # Pool speed does not depend on the stroke distance
+        return self.get_mean_speed()
+
     def get_spent_calories(self) -> float:
         """Count calories burnt during the session."""
 
-        return ((self.get_mean_speed()
+        return self._spent_calories(self.get_mean_speed())
+
+    def _spent_calories(self, speed: float) -> float:
+        return ((speed
                 + self.SWM_CAL_COEFF_1)
                 * self.SWM_CAL_COEFF_2
                 * self.weight)
 
 
+def validate_package(workout_type: str,
+                     data: Sequence) -> Optional[PackageError]:
+    """Error of a package, or None if it can be read."""
+
+    workout = WORKOUTS.get(workout_type)
+    if workout is None:
+        return UnknownWorkoutError(
+            workout_type,
+            f'Sorry. <{workout_type}> is undefined workout type.'
+        )
+    if len(data) != workout.arity:
+        return PackageError(
+            workout_type,
+            f'Sorry, <{workout.workout_class.__name__}> class instance '
+            f'expects {workout.arity} data elements, got {len(data)}.'
+        )
+    # The same rules as validate_columns, one package at a time
+    for name, value in zip(workout.field_names, data):
+        if name in POSITIVE_FIELDS:
+            if not value > 0:
+                return PackageError(
+                    workout_type, f'Sorry, {name} must be positive.'
+                )
+        elif not value >= 0:
+            return PackageError(
+                workout_type, f'Sorry, {name} must be non-negative.'
+            )
+        if not math.isfinite(value):
+            return PackageError(
+                workout_type, f'Sorry, {name} must be finite.'
+            )
+    return None
+
+
 def read_package(workout_type: str, data: list) -> Training:
     """Read the data from sensors
     and create a class's object."""
 
-    # Dict to decipher a workout code from fitness-module
-    workout_dict_type = Dict[str, Type[Training]]
-    workout_dict: workout_dict_type = {'SWM': Swimming,
-                                       'RUN': Running,
-                                       'WLK': SportsWalking
-                                       }
-
+    error = validate_package(workout_type, data)
+    if error is not None:
+        raise error
     # The creation of Training class instance
-    workout_class = workout_dict.get(workout_type)
-    if workout_class is None:
-        raise KeyError(f'Sorry. <{workout_type}> is undefined workout type.')
-    try:
-        workout_session = workout_class(*data)
-    except TypeError:
-        print(f'Sorry, an error has occurred. Please check '
-              f'that the correct number of data elements  '
-              f'is passed to <{workout_dict.get(workout_type).__name__}> '
-              f'class instance.')
-    else:
-        return workout_session
+    return WORKOUTS[workout_type].build(data)
 
 
-def main(training: Training) -> None:
+def main(training: Training, sink: Optional['ThreadedSink'] = None) -> None:
     """The main func."""
 
     # The creation of MessageInfo class instance for a specific workout
     info = training.show_training_info()
     # Print str of human-readable data for a corresponding Training instance
-    print(info.get_message())
+    if sink is None:
+        print(info.get_message())
+    else:
+        sink.write(info.get_message())
 
 
-if __name__ == '__main__':
-    packages = [
-        # num_of_strokes, time_in_hrs, user_weight,
-        # pool_len, num_of_pools_covered
-        ('SWM', [720, 1, 80, 25, 40]),
-        # num_of_steps, time_in_hrs, user_weight
-        ('RUN', [15000, 1, 75]),
-        # num_of_steps, time_in_hrs, user_weight, user_len
-        ('WLK', [9000, 1, 75, 180]),
-    ]
+# Batch computation. Every kernel repeats the formulas of the matching
+# Training subclass operation by operation, so that the columnar path
+# stays bit-identical to the per-object one. Kernels work both on
+# scalars and on NumPy arrays.
+Columns = Mapping[str, Sequence]
+
+
+def _power(base: Any, exponent: Any) -> Any:
+    """Raise to a power through libm pow() like `float.__pow__` does."""
+
+    if isinstance(base, (int, float)):
+        return base ** exponent
+    return numpy().power(base, exponent)
+
+
+def register_kernel(code: str) -> Callable[[Callable], Callable]:
+    """Attach a batch kernel to a registered workout type."""
+
+    def register(kernel: Callable) -> Callable:
+        WORKOUTS[code].kernel = kernel
+        return kernel
+
+    return register
+
+
+def _object_kernel(workout_class: type, *data: Any) -> Tuple[Any, Any, Any]:
+    """Per-session fallback for workout types without a kernel."""
+
+    training = workout_class(*data)
+    distance = training.get_distance()
+    speed = training._mean_speed(distance)
+    return distance, speed, training._spent_calories(speed)
+
+
+@register_kernel('RUN')
+def _running_kernel(coeffs: Any, action: Any, duration: Any,
+                    weight: Any) -> Tuple[Any, Any, Any]:
+    """Distance, speed and calories of Running sessions."""
+
+    distance = (action * coeffs.LEN_STEP) / coeffs.M_IN_KM
+    speed = distance / duration
+    calories = ((coeffs.RUN_CAL_COEFF_1 * speed
+                - coeffs.RUN_CAL_COEFF_2)
+                * weight
+                / coeffs.M_IN_KM
+                * duration * MINS_IN_HOUR
+                )
+    return distance, speed, calories
+
+
+@register_kernel('WLK')
+def _walking_kernel(coeffs: Any, action: Any, duration: Any,
+                    weight: Any, height: Any) -> Tuple[Any, Any, Any]:
+    """Distance, speed and calories of SportsWalking sessions."""
+
+    distance = (action * coeffs.LEN_STEP) / coeffs.M_IN_KM
+    speed = distance / duration
+    calories = ((coeffs.WALK_CAL_COEFF_1 * weight
+                + (_power(speed, coeffs.WALK_CAL_COEFF_2) // height)
+                * coeffs.WALK_CAL_COEFF_3 * weight)
+                * duration * MINS_IN_HOUR
+                )
+    return distance, speed, calories
+
+
+@register_kernel('SWM')
+def _swimming_kernel(coeffs: Any, action: Any, duration: Any,
+                     weight: Any, length_pool: Any,
+                     count_pool: Any) -> Tuple[Any, Any, Any]:
+    """Distance, speed and calories of Swimming sessions."""
+
+    distance = (action * coeffs.LEN_STEP) / coeffs.M_IN_KM
+    speed = (((length_pool
+             * count_pool)
+             / coeffs.M_IN_KM)
+             / duration
+             )
+    calories = ((speed
+                + coeffs.SWM_CAL_COEFF_1)
+                * coeffs.SWM_CAL_COEFF_2
+                * weight)
+    return distance, speed, calories
+
+
+def compute_batch(workout_type: str, columns: Columns,
+                  profile: Optional[CoefficientProfile] = None
+                  ) -> Dict[str, Any]:
+    """Compute distance, speed and calories for a batch of sessions.
+
+    `columns` maps the field names of the workout class to equally long
+    sequences (NumPy arrays, `array.array`s or lists). The result holds
+    `distance`, `speed` and `calories` as NumPy arrays when NumPy is
+    installed and as `array('d')` otherwise. Zero durations follow NumPy
+    semantics (inf/nan) on the vectorized path. Workout types registered
+    without a kernel are computed session by session. Coefficients come
+    from `profile` when it is given, from the workout class otherwise."""
+
+    workout = get_workout(workout_type)
+    kernel = workout.kernel
+    workout_class = (workout.workout_class if profile is None
+                     else profile.constants(workout_type))
+    names = workout.field_names
+    missing = [name for name in names if name not in columns]
+    if missing:
+        raise ValueError(f'Columns {missing} are required for '
+                         f'<{workout_class.__name__}> batch.')
+    lengths = {name: len(columns[name]) for name in names}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f'Columns of <{workout_class.__name__}> batch '
+                         f'differ in length: {lengths}.')
+
+    np = numpy()
+    if np is not None and kernel is not None:
+        arrays = [np.asarray(columns[name]) for name in names]
+        distance, speed, calories = kernel(workout_class, *arrays)
+        return {'distance': np.asarray(distance, dtype=np.float64),
+                'speed': np.asarray(speed, dtype=np.float64),
+                'calories': np.asarray(calories, dtype=np.float64)}
+
+    if kernel is None:
+        kernel = _object_kernel
+    distance, speed, calories = array('d'), array('d'), array('d')
+    for row in zip(*(columns[name] for name in names)):
+        row_distance, row_speed, row_calories = kernel(workout_class, *row)
+        distance.append(row_distance)
+        speed.append(row_speed)
+        calories.append(row_calories)
+    return {'distance': distance, 'speed': speed, 'calories': calories}
+
+
+class CoefficientProfile:
+    """Named set of coefficient overrides per workout code.
+
+    Each overridden workout type gets a variant subclass holding the
+    profile values as class attributes, built once per profile. Batch
+    kernels read their constants from it, and `apply` sets the same
+    values on an existing training."""
+
+    def __init__(self, name: str,
+                 overrides: Mapping[str, Mapping[str, float]]) -> None:
+        self.name = name
+        self.overrides = {code: dict(values)
+                          for code, values in overrides.items()}
+        self.variants: Dict[str, type] = {}
+        for code, values in self.overrides.items():
+            workout_class = get_workout(code).workout_class
+            unknown = [key for key in values if not key.isupper()
+                       or not hasattr(workout_class, key)]
+            if unknown:
+                raise ValueError(f'<{workout_class.__name__}> has no '
+                                 f'coefficients {unknown}.')
+            self.variants[code] = type(workout_class.__name__,
+                                       (workout_class,),
+                                       {'__module__': __name__,
+                                        '__qualname__':
+                                            workout_class.__qualname__,
+                                        **values})
+
+    def constants(self, workout_type: str) -> type:
+        """Class whose attributes are the coefficients of the profile."""
+
+        variant = self.variants.get(workout_type)
+        if variant is None:
+            return get_workout(workout_type).workout_class
+        return variant
+
+    def apply(self, training: Training) -> Training:
+        """Switch a training to the profile coefficients in place.
+
+        The training becomes an instance of the profile variant of its
+        workout class, so applying another profile replaces these
+        coefficients instead of adding to them."""
+
+        codes = {workout.workout_class: code
+                 for code, workout in WORKOUTS.items()}
+        for owner in type(training).__mro__:
+            code = codes.get(owner)
+            if code is not None:
+                training.__class__ = self.constants(code)
+                break
+        return training
+
+
+def load_profiles(path: str) -> Dict[str, CoefficientProfile]:
+    """Load `{profile: {code: {COEFFICIENT: value}}}` from a JSON file."""
+
+    import json
+
+    with open(path, encoding='utf-8') as stream:
+        config = json.load(stream)
+    return {name: CoefficientProfile(name, overrides)
+            for name, overrides in config.items()}
+
+
+def compute_profiles(workout_type: str, columns: Columns,
+                     profiles: Iterable[CoefficientProfile]
+                     ) -> Dict[str, Dict[str, Any]]:
+    """Batch metrics of the same columns under several profiles."""
+
+    np = numpy()
+    if np is not None:
+        # Convert once, compute_batch then reuses the arrays as they are
+        columns = {name: np.asarray(column)
+                   for name, column in columns.items()}
+    return {profile.name: compute_batch(workout_type, columns, profile)
+            for profile in profiles}
+
+
+def _chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most `size` items."""
+
+    iterator = iter(items)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+# Batched rendering. `%`-formatting with a single tuple per message is
+# byte-identical to InfoMessage.TRAINING_INFO_MESSAGE but skips the
+# per-field attribute lookups of str.format.
+MESSAGE_TEMPLATE = ('Тип тренировки: %s; '
+                    'Длительность: %.3f ч.; '
+                    'Дистанция: %.3f км; '
+                    'Ср. скорость: %.3f км/ч; '
+                    'Потрачено ккал: %.3f.'
+                    )
+_message_fields = attrgetter('training_type', 'duration', 'distance',
+                             'speed', 'calories')
+
+
+def render_messages(infos: Iterable[InfoMessage]) -> List[str]:
+    """Render many info messages at once."""
+
+    return list(map(MESSAGE_TEMPLATE.__mod__, map(_message_fields, infos)))
+
+
+def render_columns(training_type: Union[str, Iterable[str]],
+                   duration: Iterable[float], distance: Iterable[float],
+                   speed: Iterable[float],
+                   calories: Iterable[float]) -> List[str]:
+    """Render messages straight from columns, e.g. `compute_batch` ones."""
+
+    if isinstance(training_type, str):
+        training_type = repeat(training_type)
+    return list(map(MESSAGE_TEMPLATE.__mod__,
+                    zip(training_type, duration, distance, speed, calories)))
+
+
+def write_messages(infos: Iterable[InfoMessage], stream: IO[str],
+                   chunk_size: int = 10000) -> int:
+    """Write newline-terminated messages in chunks, return their number."""
+
+    count = 0
+    for chunk in _chunked(infos, chunk_size):
+        lines = render_messages(chunk)
+        lines.append('')
+        stream.write('\n'.join(lines))
+        count += len(chunk)
+    return count
+
+
+# Batch validation. Every field must be finite, fields used as divisors
+# (and body measurements) positive, any other field non-negative; the
+# mean speed must not exceed MAX_SPEED of the workout class. Rules are
+# checked column by column, NumPy-vectorized when available.
+POSITIVE_FIELDS = frozenset({'duration', 'weight', 'height', 'length_pool'})
+
+
+@dataclass
+class ValidationResult:
+    """Valid sessions of a batch and reasons for the rejected ones."""
+
+    valid: Dict[str, Any]
+    valid_index: List[int]
+    rejected: Dict[int, List[str]]
+
+
+def _nonzero(mask: Any) -> List[int]:
+    """Indices of the true items of a mask."""
+
+    if isinstance(mask, list):
+        return [index for index, flag in enumerate(mask) if flag]
+    return numpy().flatnonzero(mask).tolist()
+
+
+def _take(column: Any, indices: List[int]) -> Any:
+    """Items of a column at `indices`, keeping the column type."""
+
+    if isinstance(column, array):
+        return array(column.typecode, map(column.__getitem__, indices))
+    if isinstance(column, list):
+        return list(map(column.__getitem__, indices))
+    return numpy().asarray(column)[indices]
+
+
+def _field_failures(names: Sequence[str],
+                    columns: Columns) -> List[Tuple[str, Any]]:
+    """Reason and per-session failure flags of every field rule."""
+
+    np = numpy()
+    failures = []
+    for name in names:
+        positive = name in POSITIVE_FIELDS
+        if np is not None:
+            column = np.asarray(columns[name])
+            bad = ~(column > 0) if positive else ~(column >= 0)
+        elif positive:
+            bad = [not value > 0 for value in columns[name]]
+        else:
+            bad = [not value >= 0 for value in columns[name]]
+        rule = 'positive' if positive else 'non-negative'
+        failures.append((f'{name} must be {rule}', bad))
+        failures.append((f'{name} must be finite',
+                         ~np.isfinite(column) if np is not None
+                         else [not math.isfinite(value)
+                               for value in columns[name]]))
+    return failures
+
+
+def validate_columns(workout_type: str, columns: Columns) -> ValidationResult:
+    """Split a batch into valid sessions and rejected ones with reasons.
+
+    Only rejected sessions are visited one by one, to collect reasons."""
+
+    workout = get_workout(workout_type)
+    names = workout.field_names
+    np = numpy()
+    failures = _field_failures(names, columns)
+
+    if np is not None:
+        valid = np.ones(len(columns[names[0]]), dtype=bool)
+        for _, bad in failures:
+            valid &= ~bad
+    else:
+        valid = [not any(flags) for flags in
+                 zip(*(bad for _, bad in failures))]
+    candidates = _nonzero(valid)
+
+    # Speed is only computed for sessions that can be computed at all
+    subset = {name: _take(columns[name], candidates) for name in names}
+    speed = compute_batch(workout_type, subset)['speed']
+    limit = workout.workout_class.MAX_SPEED
+    too_fast = [candidates[position] for position in _nonzero(
+        speed > limit if isinstance(speed, getattr(np, 'ndarray', ()))
+        else [value > limit for value in speed]
+    )]
+    for index in too_fast:
+        valid[index] = False
+
+    rejected: Dict[int, List[str]] = {}
+    for reason, bad in failures:
+        for index in _nonzero(bad):
+            rejected.setdefault(index, []).append(reason)
+    for index in too_fast:
+        rejected[index] = [f'speed above {limit} km/h']
+
+    valid_index = _nonzero(valid)
+    return ValidationResult(
+        {name: _take(columns[name], valid_index) for name in names},
+        valid_index,
+        dict(sorted(rejected.items())),
+    )
+
+
+# Struct-of-arrays storage: one float64 array per package field instead
+# of one object (with its own __dict__) per session.
+class TrainingTable:
+    """Compact column storage for sessions of a single workout type.
+
+    Every column is float64, as int fields may carry float readings
+    (a 180.5 cm height) just like in `read_package`."""
+
+    def __init__(self, workout_type: str,
+                 rows: Iterable[Sequence] = ()) -> None:
+        workout = get_workout(workout_type)
+        self.workout_type = workout_type
+        self.workout_class = workout.workout_class
+        self.columns: Dict[str, array] = {
+            name: array('d') for name in workout.field_names
+        }
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self.columns['action'])
+
+    def append(self, data: Sequence) -> None:
+        """Add a session given in the `read_package` data order."""
+
+        if len(data) != len(self.columns):
+            raise ValueError(
+                f'<{self.workout_class.__name__}> expects '
+                f'{len(self.columns)} data elements, got {len(data)}.'
+            )
+        for column, value in zip(self.columns.values(), data):
+            column.append(value)
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        """Add several sessions."""
+
+        for data in rows:
+            self.append(data)
+
+    def __getitem__(self, index: int) -> Training:
+        """Materialize a single session as a regular Training object."""
+
+        return self.workout_class(
+            *(column[index] for column in self.columns.values())
+        )
+
+    def show_training_info(self, index: int) -> InfoMessage:
+        """Info message about the session at `index`."""
+
+        return self[index].show_training_info()
+
+    def compute(self) -> Dict[str, Any]:
+        """Distance, speed and calories of every session at once."""
+
+        return compute_batch(self.workout_type, self.columns)
+
+    def iter_info(self) -> Iterator[InfoMessage]:
+        """Yield an info message per session, computed in one batch."""
+
+        metrics = self.compute()
+        name = self.workout_class.__name__
+        return map(InfoMessage,
+                   (name for _ in range(len(self))),
+                   self.columns['duration'],
+                   metrics['distance'],
+                   metrics['speed'],
+                   metrics['calories'])
+
+
+# Streaming pipeline: reader -> read_package -> show_training_info ->
+# formatter -> sink. Every stage is lazy, so a consumer that stops pulling
+# stops the whole chain and memory use does not depend on input size.
+Package = Tuple[str, list]
+
+
+def parse_number(token: str) -> Union[int, float]:
+    """Turn a sensor value into int when possible, float otherwise."""
+
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+
+def parse_package(line: str) -> Package:
+    """Parse a `CODE,v1,v2,...` line into a package."""
+
+    workout_type, *values = line.strip().split(',')
+    workout_type = workout_type.strip()
+    try:
+        return workout_type, [parse_number(value) for value in values]
+    except ValueError as error:
+        raise PackageError(workout_type, f'Malformed package: {error}')
+
+
+def read_lines(source: Union[str, IO[str]]) -> Iterator[str]:
+    """Lazily yield meaningful lines of a file path, `-` or a stream."""
+
+    if isinstance(source, str):
+        if source == '-':
+            yield from read_lines(sys.stdin)
+            return
+        with open(source, encoding='utf-8') as stream:
+            yield from read_lines(stream)
+        return
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+@dataclass
+class StageCounter:
+    """Throughput counter of a single pipeline stage."""
+
+    items: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items processed per second of time spent in the stage."""
+
+        return self.items / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class PipelineStats:
+    """Per-stage counters of a pipeline run."""
+
+    STAGES = ('read', 'parse', 'read_package',
+              'show_training_info', 'format', 'sink')
+
+    stages: Dict[str, StageCounter] = field(
+        default_factory=lambda: {name: StageCounter()
+                                 for name in PipelineStats.STAGES}
+    )
+    skipped: int = 0
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """Snapshot of the counters as plain data."""
+
+        return {name: {'items': counter.items,
+                       'seconds': counter.seconds,
+                       'throughput': counter.throughput}
+                for name, counter in self.stages.items()}
+
+
+def _to_package(item: Union[str, Package]) -> Package:
+    """Accept both raw lines and ready `(code, data)` packages."""
+
+    return parse_package(item) if isinstance(item, str) else item
+
+
+def report_error(error: PackageError) -> None:
+    """Default handler of malformed packages: complain on stderr."""
+
+    print(error, file=sys.stderr)
+
+
+# Errors a valid-looking package can still raise while being computed,
+# e.g. OverflowError for huge values; they are reported as PackageError
+COMPUTATION_ERRORS = (ArithmeticError, TypeError)
+
+
+def _computation_error(workout_type: str, error: Exception) -> PackageError:
+    return PackageError(workout_type, f'Sorry, {error}.')
+
+
+def stream_messages(source: Iterable[Union[str, Package]],
+                    stats: Optional[PipelineStats] = None,
+                    on_error: Callable[[PackageError], Any] = report_error
+                    ) -> Iterator[str]:
+    """Lazily turn packages or package lines into message strings.
+
+    Malformed packages, and ones that fail to compute, are passed to
+    `on_error` and skipped."""
+
+    if stats is None:
+        for item in source:
+            try:
+                workout_type, data = _to_package(item)
+                message = read_package(
+                    workout_type, data
+                ).show_training_info().get_message()
+            except PackageError as error:
+                on_error(error)
+                continue
+            except COMPUTATION_ERRORS as error:
+                on_error(_computation_error(workout_type, error))
+                continue
+            yield message
+        return
+    yield from _timed_messages(source, stats, on_error)
+
+
+def _timed_messages(source: Iterable[Union[str, Package]],
+                    stats: PipelineStats,
+                    on_error: Callable[[PackageError], Any]
+                    ) -> Iterator[str]:
+    """`stream_messages` that adds the time of every stage to `stats`."""
+
+    stages = stats.stages
+    clock = time.perf_counter
+    iterator = iter(source)
+    while True:
+        started = clock()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        parsed = clock()
+        stages['read'].seconds += parsed - started
+        stages['read'].items += 1
+        try:
+            workout_type, data = _to_package(item)
+            built = clock()
+            training = read_package(workout_type, data)
+            done = clock()
+            info = training.show_training_info()
+            shown = clock()
+            message = info.get_message()
+        except PackageError as error:
+            stats.skipped += 1
+            on_error(error)
+            continue
+        except COMPUTATION_ERRORS as error:
+            stats.skipped += 1
+            on_error(_computation_error(workout_type, error))
+            continue
+        stages['parse'].seconds += built - parsed
+        stages['parse'].items += 1
+        stages['read_package'].seconds += done - built
+        stages['read_package'].items += 1
+        stages['show_training_info'].seconds += shown - done
+        stages['show_training_info'].items += 1
+        stages['format'].seconds += clock() - shown
+        stages['format'].items += 1
+        yield message
 
+
+def run_pipeline(source: Iterable[Union[str, Package]],
+                 sink: Callable[[str], Any] = print,
+                 stats: Optional[PipelineStats] = None,
+                 on_error: Callable[[PackageError], Any] = report_error
+                 ) -> int:
+    """Push every message of `source` into `sink`, return their number.
+
+    The sink is called synchronously, so a slow sink slows the reader
+    down instead of letting messages pile up in memory."""
+
+    count = 0
+    if stats is None:
+        for message in stream_messages(source, on_error=on_error):
+            sink(message)
+            count += 1
+        return count
+
+    counter = stats.stages['sink']
+    for message in stream_messages(source, stats, on_error):
+        started = time.perf_counter()
+        sink(message)
+        counter.seconds += time.perf_counter() - started
+        counter.items += 1
+        count += 1
+    return count
+
+
+PackageResult = Union[InfoMessage, PackageError]
+
+
+def process_package(workout_type: str, data: list) -> PackageResult:
+    """Info message of a package, or the error it has caused."""
+
+    try:
+        return read_package(workout_type, data).show_training_info()
+    except PackageError as error:
+        return error
+    except COMPUTATION_ERRORS as error:
+        # Keep the rest of the batch: the error is returned in place
+        return _computation_error(workout_type, error)
+
+
+def _process_chunk(chunk: List[Package]) -> List[PackageResult]:
+    """Worker side of `process_packages`."""
+
+    return [process_package(*package) for package in chunk]
+
+
+def process_packages(packages: Iterable[Package],
+                     workers: Optional[int] = None,
+                     chunk_size: int = 1000) -> List[PackageResult]:
+    """Process packages on a pool of worker processes.
+
+    Packages are shipped in chunks of `chunk_size` to amortize pickling.
+    The result keeps the input order; a malformed package yields a
+    `PackageError` in its place instead of stopping the run."""
+
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunked(packages, chunk_size)
+    if workers == 1:
+        return list(chain.from_iterable(map(_process_chunk, chunks)))
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(chain.from_iterable(
+            executor.map(_process_chunk, chunks)
+        ))
+
+
+# Binary packets: a 3-byte ASCII workout code followed by the package
+# fields in declaration order as little-endian, unpadded float64, so
+# int fields may carry float readings as they do in `read_package`.
+def packet_struct(workout_type: str) -> struct.Struct:
+    """Record layout of a workout type."""
+
+    import struct
+
+    workout = get_workout(workout_type)
+    return struct.Struct('<3s' + 'd' * workout.arity)
+
+
+PACKET_STRUCTS: Dict[bytes, struct.Struct] = {}
+
+
+def _packet_layout(code: bytes) -> struct.Struct:
+    """Cached record layout of an encoded workout code."""
+
+    layout = PACKET_STRUCTS.get(code)
+    if layout is None:
+        layout = PACKET_STRUCTS[code] = packet_struct(code.decode('ascii'))
+    return layout
+
+
+def write_packets(stream: IO[bytes], packages: Iterable[Package]) -> int:
+    """Encode packages into a binary stream, return their number."""
+
+    count = 0
     for workout_type, data in packages:
-        training = read_package(workout_type, data)
-        # Passing of Training class instance to the main function
-        main(training)
+        code = workout_type.encode('ascii')
+        stream.write(_packet_layout(code).pack(code, *data))
+        count += 1
+    return count
+
+
+class PacketFile:
+    """Memory-mapped file of binary packets.
+
+    Records are decoded straight from the mapping. Column views returned
+    by `columns()` for a single-type file share memory with the mapping
+    and must not outlive `close()`."""
+
+    def __init__(self, path: str) -> None:
+        import mmap
+
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = (mmap.mmap(self._file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+                     if size else None)
+        self.buffer = memoryview(self._map if size else b'')
+
+    def __enter__(self) -> 'PacketFile':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the mapping and the file."""
+
+        self.buffer.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __iter__(self) -> Iterator[Package]:
+        """Yield `(workout_type, data)` packages in file order."""
+
+        buffer, offset, end = self.buffer, 0, len(self.buffer)
+        while offset < end:
+            layout = _packet_layout(bytes(buffer[offset:offset + 3]))
+            code, *data = layout.unpack_from(buffer, offset)
+            offset += layout.size
+            yield code.decode('ascii'), data
+
+    def _single_type(self) -> Optional[bytes]:
+        """Code of the file if it can hold only records of one type."""
+
+        if not self.buffer:
+            return None
+        code = bytes(self.buffer[:3])
+        if len(self.buffer) % _packet_layout(code).size:
+            return None
+        return code
+
+    def columns(self) -> Dict[str, Dict[str, Any]]:
+        """Decode the file into per-type columns for `compute_batch`."""
+
+        code = self._single_type()
+        if code is not None:
+            columns = self._uniform_columns(code)
+            if columns is not None:
+                return {code.decode('ascii'): columns}
+
+        tables: Dict[str, TrainingTable] = {}
+        for workout_type, data in self:
+            if workout_type not in tables:
+                tables[workout_type] = TrainingTable(workout_type)
+            tables[workout_type].append(data)
+        return {workout_type: table.columns
+                for workout_type, table in tables.items()}
+
+    def _uniform_columns(self, code: bytes) -> Optional[Dict[str, Any]]:
+        """Columns of a single-type file, or None if types are mixed."""
+
+        layout = _packet_layout(code)
+        names = get_workout(code.decode('ascii')).field_names
+        np = numpy()
+        if np is not None:
+            dtype = np.dtype([('code', 'S3')] + [
+                (name, '<' + typecode) for name, typecode
+                in zip(names, layout.format[3:])
+            ])
+            records = np.frombuffer(self.buffer, dtype=dtype)
+            if not (records['code'] == code).all():
+                return None
+            return {name: records[name] for name in names}
+
+        codes, *values = zip(*layout.iter_unpack(self.buffer))
+        if codes.count(code) != len(codes):
+            return None
+        return {name: array(typecode, column) for name, typecode, column
+                in zip(names, layout.format[3:], values)}
+
+    def compute(self) -> Dict[str, Dict[str, Any]]:
+        """Batch metrics of every workout type in the file."""
+
+        return {workout_type: compute_batch(workout_type, columns)
+                for workout_type, columns in self.columns().items()}
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+
+    if not values:
+        return 0.0
+    # The rounding keeps products like 0.07 * 100 from ranking one too high
+    rank = math.ceil(round(fraction * len(values), 9))
+    return values[min(len(values), max(1, rank)) - 1]
+
+
+def reply_to_line(line: str) -> str:
+    """Response of the package server to one `CODE,v1,v2,...` line."""
+
+    try:
+        result = process_package(*parse_package(line))
+    except PackageError as error:
+        result = error
+    if isinstance(result, PackageError):
+        return f'ERROR: {result}'
+    return result.get_message()
+
+
+class PackageServer:
+    """Asyncio server answering package lines with info messages.
+
+    Connections enqueue lines into a bounded queue shared by
+    `concurrency` workers, so a flood of packages makes readers wait
+    instead of growing memory. Replies keep the order of the lines of
+    each connection."""
+
+    def __init__(self, concurrency: int = 4, queue_size: int = 1024,
+                 latency_window: int = 10000) -> None:
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.latencies: deque = deque(maxlen=latency_window)
+        self.requests = 0
+        self.errors = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0,
+                    path: Optional[str] = None) -> None:
+        """Listen on TCP `host:port` or, if `path` is set, a Unix socket."""
+
+        import asyncio
+
+        self._queue = asyncio.Queue(self.queue_size)
+        self._workers = [asyncio.create_task(self._work())
+                         for _ in range(self.concurrency)]
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle, path
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, host, port
+            )
+
+    @property
+    def address(self) -> Any:
+        """Address of the first listening socket."""
+
+        return self._server.sockets[0].getsockname()
+
+    async def close(self) -> None:
+        """Stop accepting connections and cancel the workers."""
+
+        import asyncio
+
+        self._server.close()
+        await self._server.wait_closed()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _work(self) -> None:
+        while True:
+            line, reply, started = await self._queue.get()
+            try:
+                message = reply_to_line(line)
+            except Exception as error:
+                # A worker outlives any line: the reply is always resolved
+                message = f'ERROR: {error}'
+            finally:
+                self._queue.task_done()
+            self.requests += 1
+            if message.startswith('ERROR: '):
+                self.errors += 1
+            self.latencies.append(time.perf_counter() - started)
+            if not reply.done():
+                reply.set_result(message)
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        import asyncio
+
+        replies: asyncio.Queue = asyncio.Queue(self.queue_size)
+        responder = asyncio.create_task(self._respond(replies, writer))
+        loop = asyncio.get_running_loop()
+        try:
+            async for raw in reader:
+                line = raw.decode('utf-8').strip()
+                if not line:
+                    continue
+                reply = loop.create_future()
+                await replies.put(reply)
+                await self._queue.put((line, reply, time.perf_counter()))
+        finally:
+            await replies.put(None)
+            await responder
+
+    @staticmethod
+    async def _respond(replies: asyncio.Queue,
+                       writer: asyncio.StreamWriter) -> None:
+        while True:
+            reply = await replies.get()
+            if reply is None:
+                break
+            writer.write((await reply).encode('utf-8') + b'\n')
+            await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+
+    def metrics(self) -> Dict[str, float]:
+        """Request counters and p50/p99 latency in seconds."""
+
+        latencies = sorted(self.latencies)
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'p50': percentile(latencies, 0.50),
+                'p99': percentile(latencies, 0.99)}
+
+
+# Opt-in instrumentation. Hooks are installed by wrapping the hot
+# functions only while an Instrumentation is active, so the disabled
+# state runs the original, untouched code.
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4,
+                   2.5e-4, 1e-3, 1e-2, 1e-1, float('inf'))
+
+
+@dataclass
+class Histogram:
+    """Latency histogram with fixed upper bounds in seconds."""
+
+    counts: List[int] = field(
+        default_factory=lambda: [0] * len(LATENCY_BUCKETS)
+    )
+    count: int = 0
+    total: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Add a single measurement."""
+
+        self.count += 1
+        self.total += seconds
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[index] += 1
+                return
+
+
+class Instrumentation:
+    """Call counts and latency histograms per hook and workout code.
+
+    Usage:
+        with Instrumentation() as instrumentation:
+            run_pipeline(packages)
+        print(instrumentation.prometheus())
+
+    Only the current process is instrumented: work done by
+    `process_packages` workers is not counted."""
+
+    HOOKS = ('read_package', 'show_training_info',
+             'get_spent_calories', 'get_message')
+    _active: Optional['Instrumentation'] = None
+
+    def __init__(self) -> None:
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._restore: List[Tuple[Any, str, Any]] = []
+
+    def _record(self, hook: str, code: str, seconds: float) -> None:
+        key = (hook, code)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def _wrap(self, owner: Any, name: str, hook: str,
+              code_of: Callable[..., str]) -> None:
+        original = (owner[name] if isinstance(owner, dict)
+                    else owner.__dict__[name])
+        record, clock = self._record, time.perf_counter
+
+        @wraps(original)
+        def wrapper(*args: Any) -> Any:
+            started = clock()
+            try:
+                return original(*args)
+            finally:
+                record(hook, code_of(*args), clock() - started)
+
+        if isinstance(owner, dict):
+            owner[name] = wrapper
+        else:
+            setattr(owner, name, wrapper)
+        self._restore.append((owner, name, original))
+
+    def __enter__(self) -> 'Instrumentation':
+        if Instrumentation._active is not None:
+            raise RuntimeError('Instrumentation is already enabled.')
+        Instrumentation._active = self
+        codes = {workout.workout_class: code
+                 for code, workout in WORKOUTS.items()}
+        names = {workout_class.__name__: code
+                 for workout_class, code in codes.items()}
+
+        def by_training(training: Training, *args: Any) -> str:
+            return codes.get(type(training), type(training).__name__)
+
+        # Calories are computed by _spent_calories, whether they are asked
+        # for directly or by show_training_info. Plug-ins may inherit it,
+        # so each defining class is wrapped once.
+        owners: List[type] = []
+        for workout_class in codes:
+            owner = next(owner for owner in workout_class.__mro__
+                         if '_spent_calories' in owner.__dict__)
+            if owner not in owners:
+                owners.append(owner)
+        try:
+            self._wrap(globals(), 'read_package', 'read_package',
+                       lambda workout_type, data: workout_type)
+            self._wrap(Training, 'show_training_info', 'show_training_info',
+                       by_training)
+            for owner in owners:
+                self._wrap(owner, '_spent_calories', 'get_spent_calories',
+                           by_training)
+            self._wrap(InfoMessage, 'get_message', 'get_message',
+                       lambda info: names.get(info.training_type,
+                                              info.training_type))
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        while self._restore:
+            owner, name, original = self._restore.pop()
+            if isinstance(owner, dict):
+                owner[name] = original
+            else:
+                setattr(owner, name, original)
+        Instrumentation._active = None
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Counters as `{hook: {code: {count, sum, buckets}}}`."""
+
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (hook, code), histogram in sorted(self.histograms.items()):
+            result.setdefault(hook, {})[code] = {
+                'count': histogram.count,
+                'sum': histogram.total,
+                'buckets': dict(zip(map(str, LATENCY_BUCKETS),
+                                    histogram.counts)),
+            }
+        return result
+
+    def prometheus(self) -> str:
+        """Counters in the Prometheus text exposition format."""
+
+        metric = 'homework_latency_seconds'
+        lines = [f'# TYPE {metric} histogram']
+        for (hook, code), histogram in sorted(self.histograms.items()):
+            labels = f'hook="{hook}",workout="{code}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(
+                    f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}'
+                )
+            lines.append(f'{metric}_sum{{{labels}}} {histogram.total!r}')
+            lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+@dataclass
+class Totals:
+    """Running totals of a group of sessions."""
+
+    count: int = 0
+    duration: float = 0.0
+    distance: float = 0.0
+    speed: float = 0.0
+    calories: float = 0.0
+    min_speed: float = float('inf')
+    max_speed: float = float('-inf')
+    min_calories: float = float('inf')
+    max_calories: float = float('-inf')
+
+    @property
+    def mean_speed(self) -> float:
+        """Average of the session speeds."""
+
+        return self.speed / self.count if self.count else 0.0
+
+    def add(self, info: InfoMessage) -> None:
+        """Fold a single session in."""
+
+        self.count += 1
+        self.duration += info.duration
+        self.distance += info.distance
+        self.speed += info.speed
+        self.calories += info.calories
+        self.min_speed = min(self.min_speed, info.speed)
+        self.max_speed = max(self.max_speed, info.speed)
+        self.min_calories = min(self.min_calories, info.calories)
+        self.max_calories = max(self.max_calories, info.calories)
+
+    def merge(self, other: 'Totals') -> None:
+        """Fold another group in."""
+
+        self.count += other.count
+        self.duration += other.duration
+        self.distance += other.distance
+        self.speed += other.speed
+        self.calories += other.calories
+        self.min_speed = min(self.min_speed, other.min_speed)
+        self.max_speed = max(self.max_speed, other.max_speed)
+        self.min_calories = min(self.min_calories, other.min_calories)
+        self.max_calories = max(self.max_calories, other.max_calories)
+
+
+class SessionAggregator:
+    """Incremental per-user, per-training-type totals in time buckets.
+
+    Sessions fall into buckets of `window` seconds by their timestamp;
+    only the latest `retention` buckets are kept. Adding a session costs
+    O(1), queries merge the live buckets."""
+
+    def __init__(self, window: float = 86400, retention: int = 7) -> None:
+        self.window = window
+        self.retention = retention
+        self.buckets: Dict[int, Dict[Tuple[str, str], Totals]] = {}
+
+    def add(self, user: str, info: InfoMessage, timestamp: float) -> None:
+        """Fold a session of `user` finished at `timestamp` in."""
+
+        bucket = self.buckets.setdefault(int(timestamp // self.window), {})
+        key = (user, info.training_type)
+        totals = bucket.get(key)
+        if totals is None:
+            totals = bucket[key] = Totals()
+        totals.add(info)
+
+    def expire(self, now: float) -> int:
+        """Drop buckets out of retention at `now`, return their number."""
+
+        oldest = int(now // self.window) - self.retention + 1
+        expired = [index for index in self.buckets if index < oldest]
+        for index in expired:
+            del self.buckets[index]
+        return len(expired)
+
+    def totals(self, user: Optional[str] = None,
+               training_type: Optional[str] = None,
+               since: Optional[float] = None) -> Totals:
+        """Merged totals of the live buckets matching the filters."""
+
+        first = None if since is None else int(since // self.window)
+        result = Totals()
+        for index, bucket in self.buckets.items():
+            if first is not None and index < first:
+                continue
+            for (bucket_user, bucket_type), totals in bucket.items():
+                if user is not None and bucket_user != user:
+                    continue
+                if (training_type is not None
+                        and bucket_type != training_type):
+                    continue
+                result.merge(totals)
+        return result
+
+    def checkpoint(self, path: str) -> None:
+        """Atomically save the state to a JSON file."""
+
+        import json
+
+        state = {
+            'window': self.window,
+            'retention': self.retention,
+            'buckets': [[index, user, training_type, asdict(totals)]
+                        for index, bucket in self.buckets.items()
+                        for (user, training_type), totals in bucket.items()],
+        }
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as stream:
+            json.dump(state, stream)
+        os.replace(temporary, path)
+
+    @classmethod
+    def restore(cls, path: str) -> 'SessionAggregator':
+        """Load an aggregator saved by `checkpoint`."""
+
+        import json
+
+        with open(path, encoding='utf-8') as stream:
+            state = json.load(stream)
+        aggregator = cls(state['window'], state['retention'])
+        for index, user, training_type, totals in state['buckets']:
+            aggregator.buckets.setdefault(index, {})[
+                (user, training_type)
+            ] = Totals(**totals)
+        return aggregator
+
+
+# Bulk files. CSV packages are `code,v1,v2,...` rows without a header;
+# session files hold one InfoMessage per row under MESSAGE_COLUMNS.
+MESSAGE_COLUMNS = ('training_type', 'duration', 'distance', 'speed',
+                   'calories')
+BUFFER_SIZE = 1 << 20
+
+
+def _read_csv_rows(path: str) -> Dict[str, Tuple[array, int]]:
+    """Flat float64 values and arity per workout type of a package CSV."""
+
+    import csv
+
+    rows: Dict[str, Tuple[array, int]] = {}
+    with open(path, newline='', buffering=BUFFER_SIZE) as stream:
+        reader = csv.reader(stream, skipinitialspace=True)
+        for workout_type, *values in filter(None, reader):
+            state = rows.get(workout_type)
+            if state is None:
+                workout_type = workout_type.strip()
+                if not workout_type and not values:
+                    continue
+                state = rows.setdefault(workout_type, (
+                    array('d'), get_workout(workout_type).arity
+                ))
+            flat, arity = state
+            try:
+                if len(values) != arity:
+                    raise ValueError(f'expected {arity} data elements, '
+                                     f'got {len(values)}')
+                flat.extend(map(float, values))
+            except ValueError as error:
+                raise PackageError(
+                    workout_type,
+                    f'Malformed package on line {reader.line_num}: {error}'
+                )
+    return rows
+
+
+def read_packages_csv(path: str) -> Dict[str, TrainingTable]:
+    """Load a CSV file of packages into a column table per workout type.
+
+    Cells are parsed straight into one flat float64 array per workout
+    type, which is split into the table columns at the end; the field
+    rules of `validate_package` are checked on whole columns. Blank rows
+    are skipped; a malformed row raises PackageError."""
+
+    tables: Dict[str, TrainingTable] = {}
+    for workout_type, (flat, arity) in _read_csv_rows(path).items():
+        table = tables[workout_type] = TrainingTable(workout_type)
+        for index, column in enumerate(table.columns.values()):
+            column.extend(flat[index::arity])
+        for reason, bad in _field_failures(table.columns, table.columns):
+            if _nonzero(bad):
+                raise PackageError(workout_type, f'Sorry, {reason}.')
+    return tables
+
+
+def write_messages_csv(path: str, infos: Iterable[InfoMessage],
+                       chunk_size: int = 100000) -> int:
+    """Write info messages as CSV rows, return their number."""
+
+    import csv
+
+    count = 0
+    with open(path, 'w', newline='', buffering=BUFFER_SIZE) as stream:
+        writer = csv.writer(stream)
+        writer.writerow(MESSAGE_COLUMNS)
+        for chunk in _chunked(infos, chunk_size):
+            writer.writerows(map(_message_fields, chunk))
+            count += len(chunk)
+    return count
+
+
+def table_columns(table: TrainingTable) -> Dict[str, Any]:
+    """InfoMessage fields of a whole table as columns."""
+
+    metrics = table.compute()
+    return {'training_type': [table.workout_class.__name__] * len(table),
+            'duration': table.columns['duration'],
+            'distance': metrics['distance'],
+            'speed': metrics['speed'],
+            'calories': metrics['calories']}
+
+
+def write_tables_csv(path: str, tables: Iterable[TrainingTable]) -> int:
+    """Compute and write sessions of whole tables, return their number."""
+
+    import csv
+
+    count = 0
+    with open(path, 'w', newline='', buffering=BUFFER_SIZE) as stream:
+        writer = csv.writer(stream)
+        writer.writerow(MESSAGE_COLUMNS)
+        for table in tables:
+            columns = table_columns(table)
+            # Python floats format faster than NumPy scalars
+            writer.writerows(zip(*(
+                column if isinstance(column, list) else column.tolist()
+                for column in map(columns.__getitem__, MESSAGE_COLUMNS)
+            )))
+            count += len(table)
+    return count
+
+
+def _pyarrow() -> Tuple[Any, Any, Any]:
+    """pyarrow with its compute and parquet modules."""
+
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('pyarrow is required for Parquet files: '
+                          'pip install pyarrow')
+    return pa, pc, pq
+
+
+def read_packages_parquet(path: str) -> Dict[str, TrainingTable]:
+    """Load a Parquet file of packages into a column table per type.
+
+    The file holds a `workout_type` column plus one column per field of
+    every workout type it contains, null where a type has no such
+    field. A null in a field of the type raises PackageError."""
+
+    pa, pc, pq = _pyarrow()
+    np = numpy()
+    source = pq.read_table(path)
+    codes = source.column('workout_type')
+    tables: Dict[str, TrainingTable] = {}
+    for workout_type in codes.unique().to_pylist():
+        table = tables[workout_type] = TrainingTable(workout_type)
+        rows = source.filter(pc.equal(codes, workout_type))
+        for name, column in table.columns.items():
+            values = rows.column(name).cast(pa.float64())
+            if values.null_count:
+                raise PackageError(workout_type,
+                                   f'Sorry, {name} is missing.')
+            if np is not None:
+                column.frombytes(values.to_numpy().tobytes())
+            else:
+                column.extend(values.to_pylist())
+    return tables
+
+
+def write_tables_parquet(path: str, tables: Iterable[TrainingTable]) -> int:
+    """Compute and write sessions of whole tables to a Parquet file."""
+
+    pa, _, pq = _pyarrow()
+    schema = pa.schema([('training_type', pa.string())] + [
+        (name, pa.float64()) for name in MESSAGE_COLUMNS[1:]
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for table in tables:
+            columns = table_columns(table)
+            writer.write_table(pa.table(
+                {name: columns[name] for name in MESSAGE_COLUMNS},
+                schema=schema
+            ))
+            count += len(table)
+    return count
+
+
+class SqliteCacheBackend:
+    """On-disk store of cached info messages, shared across restarts.
+
+    At most `max_rows` rows are kept: every write gets a new rowid, and
+    rows more than `max_rows` writes old are deleted by rowid range."""
+
+    def __init__(self, path: str, max_rows: int = 1000000) -> None:
+        import sqlite3
+
+        self.max_rows = max_rows
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, stored REAL, info TEXT)'
+        )
+
+    def get(self, key: str) -> Optional[Tuple[float, InfoMessage]]:
+        """Stored time and info message of `key`, if any."""
+
+        import json
+
+        row = self.connection.execute(
+            'SELECT stored, info FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], InfoMessage(*json.loads(row[1]))
+
+    def set(self, key: str, stored: float, info: InfoMessage) -> None:
+        """Store the info message of `key`."""
+
+        import json
+
+        with self.connection:
+            rowid = self.connection.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                (key, stored, json.dumps(_message_fields(info)))
+            ).lastrowid
+            self.connection.execute('DELETE FROM cache WHERE rowid <= ?',
+                                    (rowid - self.max_rows,))
+
+    def delete(self, key: str) -> None:
+        """Forget `key`."""
+
+        with self.connection:
+            self.connection.execute('DELETE FROM cache WHERE key = ?',
+                                    (key,))
+
+    def purge(self, stored_before: float) -> int:
+        """Delete rows stored before a time, return their number."""
+
+        with self.connection:
+            return self.connection.execute(
+                'DELETE FROM cache WHERE stored < ?', (stored_before,)
+            ).rowcount
+
+    def __len__(self) -> int:
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM cache'
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database."""
+
+        self.connection.close()
+
+
+# Time stored, info message and its rendered text
+CacheEntry = Tuple[float, InfoMessage, str]
+
+
+def coefficient_fingerprint() -> str:
+    """Short hash of the coefficients of every registered workout."""
+
+    import hashlib
+
+    constants = [
+        (code, workout.workout_class.__name__,
+         [(name, getattr(workout.workout_class, name))
+          for name in dir(workout.workout_class) if name.isupper()])
+        for code, workout in sorted(WORKOUTS.items())
+    ]
+    return hashlib.sha1(repr(constants).encode()).hexdigest()[:16]
+
+
+class PackageCache:
+    """Bounded LRU cache of package results with an optional TTL.
+
+    Entries are keyed on `(workout_type, data as floats)`, so resent
+    packages skip read_package, show_training_info and get_message.
+    With a `backend` (e.g. SqliteCacheBackend) computed results are also
+    stored on disk and looked up there on a memory miss. Disk keys start
+    with `version`, the coefficient fingerprint by default, so results
+    computed with other coefficients are never served; expired rows are
+    purged when the cache is created."""
+
+    def __init__(self, maxsize: int = 100000, ttl: Optional[float] = None,
+                 backend: Optional[SqliteCacheBackend] = None,
+                 clock: Callable[[], float] = time.time,
+                 version: Optional[str] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.clock = clock
+        self.version = (version if version is not None
+                        else coefficient_fingerprint())
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if backend is not None and ttl is not None:
+            backend.purge(clock() - ttl)
+
+    @staticmethod
+    def key(workout_type: str, data: Sequence) -> Tuple[str, tuple]:
+        """Cache key of a package; 15000 and 15000.0 share it."""
+
+        return workout_type, tuple(map(float, data))
+
+    def _disk_key(self, key: Tuple[str, tuple]) -> str:
+        return f'{self.version}:{key!r}'
+
+    def _expired(self, stored: float) -> bool:
+        return self.ttl is not None and self.clock() - stored > self.ttl
+
+    def _lookup(self, key: Tuple[str, tuple]) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            if not self._expired(entry[0]):
+                self.entries.move_to_end(key)
+                return entry
+            del self.entries[key]
+            self.evictions += 1
+        if self.backend is not None:
+            stored = self.backend.get(self._disk_key(key))
+            if stored is None:
+                return None
+            if self._expired(stored[0]):
+                self.backend.delete(self._disk_key(key))
+                return None
+            entry = (stored[0], stored[1], stored[1].get_message())
+            self._store(key, entry)
+            return entry
+        return None
+
+    def _store(self, key: Tuple[str, tuple], entry: CacheEntry) -> None:
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _entry(self, workout_type: str, data: Sequence) -> CacheEntry:
+        key = self.key(workout_type, data)
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        info = read_package(workout_type, list(data)).show_training_info()
+        entry = (self.clock(), info, info.get_message())
+        self._store(key, entry)
+        if self.backend is not None:
+            self.backend.set(self._disk_key(key), entry[0], info)
+        return entry
+
+    def get_info(self, workout_type: str, data: Sequence) -> InfoMessage:
+        """Info message of a package, computed at most once per entry."""
+
+        return self._entry(workout_type, data)[1]
+
+    def get_message(self, workout_type: str, data: Sequence) -> str:
+        """Rendered message of a package."""
+
+        return self._entry(workout_type, data)[2]
+
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters."""
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.entries)}
+
+
+# Output sinks. A sink takes whole batches of rendered lines; ThreadedSink
+# batches single lines and hands them to a sink on a background thread.
+class StreamSink:
+    """Write lines to a text stream, stdout by default."""
+
+    def __init__(self, stream: Optional[IO[str]] = None) -> None:
+        self.stream = stream
+
+    def write_lines(self, lines: List[str]) -> None:
+        """Write a batch of lines with a single call."""
+
+        stream = self.stream or sys.stdout
+        lines.append('')
+        stream.write('\n'.join(lines))
+        lines.pop()
+
+    def flush(self) -> None:
+        """Flush the stream."""
+
+        (self.stream or sys.stdout).flush()
+
+    def close(self) -> None:
+        """Flush; the stream belongs to the caller."""
+
+        self.flush()
+
+
+class FileSink(StreamSink):
+    """Append lines to a file."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(open(path, 'a', encoding='utf-8',
+                              buffering=BUFFER_SIZE))
+
+    def close(self) -> None:
+        """Flush and close the file."""
+
+        self.stream.close()
+
+
+class RotatingFileSink(FileSink):
+    """Append lines to a file, rotating it at `max_bytes`.
+
+    Rotation keeps `backup_count` old files as `path.1`, `path.2`, ...
+    and only happens between batches."""
+
+    def __init__(self, path: str, max_bytes: int,
+                 backup_count: int = 5) -> None:
+        super().__init__(path)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def write_lines(self, lines: List[str]) -> None:
+        """Write a batch, then rotate if the file got too big."""
+
+        super().write_lines(lines)
+        if self.stream.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self) -> None:
+        """Move the current file to `path.1` and start a new one."""
+
+        self.stream.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backup_count:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.stream = open(self.path, 'a', encoding='utf-8',
+                           buffering=BUFFER_SIZE)
+
+
+class MemorySink:
+    """Keep lines in a list, mostly for tests."""
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+
+    def write_lines(self, lines: List[str]) -> None:
+        """Store a batch of lines."""
+
+        self.lines.extend(lines)
+
+    def flush(self) -> None:
+        """Nothing to flush."""
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+
+# ThreadedSinks that have not been closed yet; their daemon threads would
+# be killed at exit, so they are closed by an atexit hook instead
+_OPEN_SINKS: weakref.WeakSet = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_sinks() -> None:
+    for sink in list(_OPEN_SINKS):
+        try:
+            sink.close()
+        except Exception as error:
+            print(error, file=sys.stderr)
+
+
+class ThreadedSink:
+    """Batch lines and write them to `sink` from a background thread.
+
+    Full batches go through a queue of at most `queue_size` batches, so
+    a slow sink blocks writers instead of using unbounded memory. Lines
+    keep their order, and `close()` writes everything before returning;
+    sinks still open at interpreter exit are closed then. An error raised
+    by the sink is re-raised by the next `flush()` or `close()`."""
+
+    def __init__(self, sink: Any = None, batch_size: int = 1000,
+                 queue_size: int = 64) -> None:
+        import queue
+        import threading
+
+        self.sink = sink if sink is not None else StreamSink()
+        self.batch_size = batch_size
+        self.batch: List[str] = []
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+        _OPEN_SINKS.add(self)
+
+    def __enter__(self) -> 'ThreadedSink':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __call__(self, line: str) -> None:
+        self.write(line)
+
+    def write(self, line: str) -> None:
+        """Add a line, handing the batch over when it is full."""
+
+        self.batch.append(line)
+        if len(self.batch) >= self.batch_size:
+            self.queue.put(self.batch)
+            self.batch = []
+
+    def _drain(self) -> None:
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                if self.error is None:
+                    self.sink.write_lines(batch)
+            except BaseException as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def _raise(self) -> None:
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self) -> None:
+        """Wait until every line written so far reached the sink."""
+
+        if self.batch:
+            self.queue.put(self.batch)
+            self.batch = []
+        self.queue.join()
+        self._raise()
+        self.sink.flush()
+
+    def close(self) -> None:
+        """Flush, stop the thread and close the sink."""
+
+        if not self.thread.is_alive():
+            return
+        _OPEN_SINKS.discard(self)
+        try:
+            self.flush()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+            self.sink.close()
+
+
+class QuantileSketch:
+    """Mergeable streaming quantile sketch with relative error bounds.
+
+    Values go into logarithmic buckets, `(gamma**(i-1), gamma**i]` with
+    `gamma = (1 + a) / (1 - a)` for relative accuracy `a`; negative
+    values and zeros are kept apart. Any quantile is then returned within
+    `a * |exact|` of the exact value of that rank, and sketches built with
+    the same accuracy merge exactly. Memory grows with the logarithm of
+    the value range; past `max_buckets` buckets per sign the smallest
+    magnitudes are collapsed together and lose the guarantee."""
+
+    def __init__(self, relative_accuracy: float = 0.01,
+                 max_buckets: int = 2048) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def add(self, value: float) -> None:
+        """Add a single value."""
+
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value == 0:
+            self.zeros += 1
+            return
+        buckets = self.positive if value > 0 else self.negative
+        index = math.ceil(math.log(abs(value)) / self._log_gamma)
+        buckets[index] = buckets.get(index, 0) + 1
+        if len(buckets) > self.max_buckets:
+            self._collapse(buckets)
+
+    def _collapse(self, buckets: Dict[int, int]) -> None:
+        """Fold the smallest-magnitude buckets into one."""
+
+        indices = sorted(buckets)
+        extra = indices[:len(indices) - self.max_buckets + 1]
+        buckets[extra[-1]] = sum(buckets.pop(index) for index in extra)
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Fold in a sketch built with the same relative accuracy."""
+
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Sketches with different accuracy '
+                             'can not be merged.')
+        for mine, theirs in ((self.positive, other.positive),
+                             (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+            while len(mine) > self.max_buckets:
+                self._collapse(mine)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _value(self, index: int, sign: int) -> float:
+        """Bucket estimate, clamped to the observed range."""
+
+        value = sign * 2 * self.gamma ** index / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def quantile(self, fraction: float) -> float:
+        """Estimate of the value at rank `fraction * (count - 1)`."""
+
+        if not self.count:
+            raise ValueError('The sketch is empty.')
+        rank = int(fraction * (self.count - 1))
+        # The extremes are tracked exactly
+        if rank <= 0:
+            return self.min
+        if rank >= self.count - 1:
+            return self.max
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return self._value(index, -1)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index, 1)
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        """State as plain data, to ship between workers."""
+
+        return {'relative_accuracy': self.relative_accuracy,
+                'max_buckets': self.max_buckets,
+                'positive': sorted(self.positive.items()),
+                'negative': sorted(self.negative.items()),
+                'zeros': self.zeros, 'count': self.count,
+                'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, state: Mapping[str, Any]) -> 'QuantileSketch':
+        """Sketch restored from `as_dict` data."""
+
+        sketch = cls(state['relative_accuracy'], state['max_buckets'])
+        sketch.positive = dict(map(tuple, state['positive']))
+        sketch.negative = dict(map(tuple, state['negative']))
+        sketch.zeros = state['zeros']
+        sketch.count = state['count']
+        sketch.min = state['min']
+        sketch.max = state['max']
+        return sketch
+
+
+class SessionSummary:
+    """Speed and calories quantile sketches per training type."""
+
+    METRICS = ('speed', 'calories')
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[Tuple[str, str], QuantileSketch] = {}
+
+    def _sketch(self, training_type: str, metric: str) -> QuantileSketch:
+        key = (training_type, metric)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = QuantileSketch(
+                self.relative_accuracy
+            )
+        return sketch
+
+    def add(self, info: InfoMessage) -> None:
+        """Add a `show_training_info` result."""
+
+        for metric in self.METRICS:
+            self._sketch(info.training_type, metric).add(
+                getattr(info, metric)
+            )
+
+    def merge(self, other: 'SessionSummary') -> None:
+        """Fold in the summary of another worker."""
+
+        for (training_type, metric), sketch in other.sketches.items():
+            self._sketch(training_type, metric).merge(sketch)
+
+    def quantiles(self, training_type: str, metric: str,
+                  fractions: Sequence[float] = (0.5, 0.9, 0.99)
+                  ) -> Dict[float, float]:
+        """Estimated quantiles of a metric of a training type."""
+
+        sketch = self.sketches[(training_type, metric)]
+        return {fraction: sketch.quantile(fraction)
+                for fraction in fractions}
+
+
+SECONDS_IN_HOUR = 3600
+
+
+class SessionAccumulator:
+    """Build a session incrementally from raw tracker samples.
+
+    A sample is a number of steps/strokes (`action`) over `seconds`,
+    plus pools completed for swimming. Only running totals are kept, and
+    `partial()` or `finalize()` turn them into the package `read_package`
+    expects, so live results use the very same formulas. Fields that do
+    not change during a workout (weight, height, pool length) are given
+    up front."""
+
+    SUMMED_FIELDS = ('action', 'count_pool')
+
+    def __init__(self, workout_type: str, **static: float) -> None:
+        self.workout = get_workout(workout_type)
+        expected = [name for name in self.workout.field_names
+                    if name not in self.SUMMED_FIELDS
+                    and name != 'duration']
+        if sorted(static) != sorted(expected):
+            raise TypeError(f'<{self.workout.workout_class.__name__}> '
+                            f'session needs {expected}.')
+        self.static = static
+        self.totals = {name: 0 for name in self.SUMMED_FIELDS
+                       if name in self.workout.field_names}
+        self.seconds = 0.0
+        self.samples = 0
+        self.finished = False
+
+    def add(self, action: int, seconds: float = 1.0,
+            count_pool: int = 0) -> None:
+        """Ingest a single sample."""
+
+        if self.finished:
+            raise RuntimeError('The session is already finalized.')
+        self.totals['action'] += action
+        if 'count_pool' in self.totals:
+            self.totals['count_pool'] += count_pool
+        self.seconds += seconds
+        self.samples += 1
+
+    def add_many(self, samples: Iterable[Sequence[float]]) -> None:
+        """Ingest a chunk of `(action, seconds[, count_pool])` samples."""
+
+        for sample in samples:
+            self.add(*sample)
+
+    @property
+    def duration(self) -> float:
+        """Duration so far in hours."""
+
+        return self.seconds / SECONDS_IN_HOUR
+
+    def package(self) -> Package:
+        """The `read_package` arguments for the session so far."""
+
+        values = dict(self.static, duration=self.duration, **self.totals)
+        return self.workout.code, [values[name]
+                                   for name in self.workout.field_names]
+
+    def partial(self) -> InfoMessage:
+        """Info message about the workout so far."""
+
+        if not self.seconds:
+            raise ValueError('No samples with a duration yet.')
+        return read_package(*self.package()).show_training_info()
+
+    def finalize(self) -> InfoMessage:
+        """Close the session and return its info message."""
+
+        info = self.partial()
+        self.finished = True
+        return info
+
+
+class ShardedJob:
+    """Reprocessing job coordinated through a shared directory.
+
+    `prepare` splits the input into shard files. Workers on any host
+    that sees the directory claim shards by creating claim files
+    exclusively, write each result under a temporary name and rename it
+    into `done/` once complete. A finished shard is never redone and a
+    claim older than `lease` seconds is taken over, so rerunning workers
+    after a crash resumes the job.
+
+    Layout: `shards/NNNNN.txt` with `CODE,v1,v2,...` lines,
+    `claims/NNNNN.claim` and `done/NNNNN.txt` with one reply (message or
+    `ERROR: ...`) per input line."""
+
+    def __init__(self, directory: str, lease: float = 600) -> None:
+        self.directory = directory
+        self.lease = lease
+        for name in ('shards', 'claims', 'done'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    def _path(self, kind: str, shard: str) -> str:
+        suffix = '.claim' if kind == 'claims' else '.txt'
+        return os.path.join(self.directory, kind, shard + suffix)
+
+    def prepare(self, lines: Iterable[str], shard_size: int = 100000) -> int:
+        """Split package lines into shards, return their number."""
+
+        if self.shards():
+            raise FileExistsError(f'{self.directory} already has shards.')
+        count = 0
+        for count, chunk in enumerate(_chunked(lines, shard_size), 1):
+            path = self._path('shards', f'{count - 1:05d}')
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as stream:
+                stream.writelines(line.rstrip('\n') + '\n'
+                                  for line in chunk)
+            os.replace(f'{path}.tmp', path)
+        return count
+
+    def shards(self) -> List[str]:
+        """Names of all shards in order."""
+
+        return sorted(name[:-4] for name in
+                      os.listdir(os.path.join(self.directory, 'shards'))
+                      if name.endswith('.txt'))
+
+    def is_done(self, shard: str) -> bool:
+        """Whether the shard has its complete result."""
+
+        return os.path.exists(self._path('done', shard))
+
+    def claim(self, worker: str) -> Optional[str]:
+        """Claim a pending shard for `worker`, None if there is none."""
+
+        for shard in self.shards():
+            if self.is_done(shard):
+                continue
+            path = self._path('claims', shard)
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL
+                                     | os.O_WRONLY)
+            except FileExistsError:
+                if not self._take_over(path):
+                    continue
+                return self.claim(worker)
+            with os.fdopen(descriptor, 'w') as stream:
+                stream.write(worker)
+            # Another worker may have finished it in the meantime
+            if self.is_done(shard):
+                os.remove(path)
+                continue
+            return shard
+        return None
+
+    def _take_over(self, path: str) -> bool:
+        """Drop a stale claim, return whether it was stale."""
+
+        try:
+            stale = time.time() - os.path.getmtime(path) > self.lease
+            if stale:
+                os.remove(path)
+            return stale
+        except FileNotFoundError:
+            return True
+
+    def process(self, shard: str) -> int:
+        """Compute a claimed shard, return the number of its lines."""
+
+        path = self._path('done', shard)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        count = 0
+        try:
+            with open(self._path('shards', shard), encoding='utf-8') as \
+                    source, open(temporary, 'w', encoding='utf-8') as target:
+                for line in source:
+                    try:
+                        reply = reply_to_line(line)
+                    except Exception as error:
+                        # Failing again on every takeover would stall the job
+                        reply = f'ERROR: {error}'
+                    target.write(reply + '\n')
+                    count += 1
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        try:
+            os.remove(self._path('claims', shard))
+        except FileNotFoundError:
+            pass
+        return count
+
+    def run_worker(self, worker: Optional[str] = None) -> int:
+        """Process shards until none is left, return how many were done."""
+
+        worker = worker or f'{os.uname().nodename}:{os.getpid()}'
+        processed = 0
+        shard = self.claim(worker)
+        while shard is not None:
+            self.process(shard)
+            processed += 1
+            shard = self.claim(worker)
+        return processed
+
+    def run_local(self, workers: Optional[int] = None) -> int:
+        """Run worker processes on this host, return shards processed."""
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.run_worker, f'local-{index}')
+                       for index in range(workers)]
+            return sum(future.result() for future in futures)
+
+    def status(self) -> Dict[str, int]:
+        """Shard counts by state."""
+
+        shards = self.shards()
+        done = sum(map(self.is_done, shards))
+        claimed = len([name for name in os.listdir(
+            os.path.join(self.directory, 'claims')
+        ) if name.endswith('.claim')])
+        return {'total': len(shards), 'done': done, 'claimed': claimed,
+                'pending': len(shards) - done}
+
+    def results(self) -> Iterator[str]:
+        """Replies of finished shards in input order."""
+
+        for shard in self.shards():
+            if self.is_done(shard):
+                yield from read_lines(self._path('done', shard))
+
+
+class SessionStore:
+    """Local sqlite store of computed sessions.
+
+    Sessions are written in bulk transactions and indexed by user,
+    timestamp and training type, so range and aggregate queries never
+    recompute anything."""
+
+    def __init__(self, path: str) -> None:
+        import sqlite3
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        # Bigger page cache keeps index updates of bulk inserts in memory
+        self.connection.execute('PRAGMA cache_size = -65536')
+        with self.connection:
+            self.connection.executescript(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' user TEXT, timestamp REAL, training_type TEXT,'
+                ' duration REAL, distance REAL, speed REAL, calories REAL);'
+                'CREATE INDEX IF NOT EXISTS sessions_user'
+                ' ON sessions (user, timestamp);'
+                'CREATE INDEX IF NOT EXISTS sessions_type'
+                ' ON sessions (training_type, timestamp);'
+                'CREATE INDEX IF NOT EXISTS sessions_timestamp'
+                ' ON sessions (timestamp);'
+            )
+
+    def __enter__(self) -> 'SessionStore':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the database."""
+
+        self.connection.close()
+
+    def add_many(self, sessions: Iterable[Tuple[str, float, InfoMessage]],
+                 chunk_size: int = 100000) -> int:
+        """Store `(user, timestamp, info)` sessions, return their number."""
+
+        count = 0
+        for chunk in _chunked(sessions, chunk_size):
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(user, timestamp) + _message_fields(info)
+                     for user, timestamp, info in chunk]
+                )
+            count += len(chunk)
+        return count
+
+    @staticmethod
+    def _where(user: Optional[str], training_type: Optional[str],
+               start: Optional[float],
+               end: Optional[float]) -> Tuple[str, list]:
+        """WHERE clause of the filters; the time range is [start, end)."""
+
+        conditions, parameters = [], []
+        for condition, value in (('user = ?', user),
+                                 ('training_type = ?', training_type),
+                                 ('timestamp >= ?', start),
+                                 ('timestamp < ?', end)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        if not conditions:
+            return '', parameters
+        return ' WHERE ' + ' AND '.join(conditions), parameters
+
+    def query(self, user: Optional[str] = None,
+              training_type: Optional[str] = None,
+              start: Optional[float] = None, end: Optional[float] = None
+              ) -> Iterator[Tuple[str, float, InfoMessage]]:
+        """Stored sessions matching the filters, by timestamp."""
+
+        where, parameters = self._where(user, training_type, start, end)
+        cursor = self.connection.execute(
+            'SELECT user, timestamp, training_type, duration, distance,'
+            ' speed, calories FROM sessions' + where + ' ORDER BY timestamp',
+            parameters
+        )
+        for user_, timestamp, *fields_ in cursor:
+            yield user_, timestamp, InfoMessage(*fields_)
+
+    def aggregate(self, user: Optional[str] = None,
+                  training_type: Optional[str] = None,
+                  start: Optional[float] = None,
+                  end: Optional[float] = None) -> Totals:
+        """Totals of the sessions matching the filters."""
+
+        where, parameters = self._where(user, training_type, start, end)
+        row = self.connection.execute(
+            'SELECT COUNT(*), SUM(duration), SUM(distance), SUM(speed),'
+            ' SUM(calories), MIN(speed), MAX(speed), MIN(calories),'
+            ' MAX(calories) FROM sessions' + where,
+            parameters
+        ).fetchone()
+        if not row[0]:
+            return Totals()
+        return Totals(*row)
+
+
+class SharedPackageRing:
+    """Shared-memory ring buffer between ingest and compute processes.
+
+    One `multiprocessing.shared_memory` block holds a header, `capacity`
+    package slots and a parallel region of result slots, so packages and
+    results never get pickled. A package slot is the workout code index
+    followed by the fields of its class as float64, which workers use as
+    they are. A result slot is the sequence number of its package and the
+    InfoMessage numbers.
+
+    A single producer calls `put_many`, any number of workers call
+    `claim`/`compute` (or `run_worker`) and a single collector calls
+    `collect`. Only claiming takes a lock; the producer waits while the
+    ring is full of uncollected results."""
+
+    HEADER_FIELDS = ('head', 'claimed', 'collected', 'closed')
+    MAX_FIELDS = 5
+
+    def __init__(self, capacity: int = 65536, name: Optional[str] = None,
+                 lock: Any = None,
+                 codes: Optional[Sequence[str]] = None) -> None:
+        import multiprocessing
+        import struct
+        from multiprocessing import shared_memory
+
+        self.capacity = capacity
+        self.codes = list(codes if codes is not None else sorted(WORKOUTS))
+        self.record = struct.Struct(f'<q{self.MAX_FIELDS}d')
+        self.result = struct.Struct('<4d')
+        self.status = struct.Struct('<q')
+        self.header = struct.Struct(f'<{len(self.HEADER_FIELDS)}q')
+        self.records_offset = self.header.size
+        self.results_offset = self.records_offset + capacity * (
+            self.record.size
+        )
+        size = self.results_offset + capacity * (
+            self.status.size + self.result.size
+        )
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name,
+                                                 create=self.owner,
+                                                 size=size if self.owner
+                                                 else 0)
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        if self.owner:
+            self.memory.buf[:size] = bytes(size)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'capacity': self.capacity, 'name': self.memory.name,
+                'lock': self.lock, 'codes': self.codes}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def _get(self, field_name: str) -> int:
+        return self.status.unpack_from(
+            self.memory.buf,
+            self.HEADER_FIELDS.index(field_name) * self.status.size
+        )[0]
+
+    def _set(self, field_name: str, value: int) -> None:
+        self.status.pack_into(
+            self.memory.buf,
+            self.HEADER_FIELDS.index(field_name) * self.status.size, value
+        )
+
+    def _record_offset(self, sequence: int) -> int:
+        return (self.records_offset
+                + sequence % self.capacity * self.record.size)
+
+    def _result_offset(self, sequence: int) -> int:
+        return (self.results_offset + sequence % self.capacity
+                * (self.status.size + self.result.size))
+
+    def put_many(self, packages: Iterable[Package],
+                 poll: float = 0.001) -> int:
+        """Write packages into the ring, waiting while it is full.
+
+        Packages that `validate_package` rejects raise PackageError before
+        anything of them is written, so workers never see a package they
+        can not compute."""
+
+        buffer, count = self.memory.buf, 0
+        head = self._get('head')
+        padding = [0.0] * self.MAX_FIELDS
+        for workout_type, data in packages:
+            error = validate_package(workout_type, data)
+            if error is not None:
+                raise error
+            while head - self._get('collected') >= self.capacity:
+                time.sleep(poll)
+            self.record.pack_into(
+                buffer, self._record_offset(head),
+                self.codes.index(workout_type),
+                *data, *padding[len(data):]
+            )
+            head += 1
+            # Publish the record only once it is completely written
+            self._set('head', head)
+            count += 1
+        return count
+
+    def close_input(self) -> None:
+        """Tell workers that no more packages will come."""
+
+        self._set('closed', 1)
+
+    def claim(self, batch: int = 1024) -> range:
+        """Reserve up to `batch` written packages for this worker."""
+
+        with self.lock:
+            claimed = self._get('claimed')
+            count = min(batch, self._get('head') - claimed)
+            self._set('claimed', claimed + count)
+        return range(claimed, claimed + count)
+
+    def _package(self, sequence: int) -> Package:
+        code, *values = self.record.unpack_from(
+            self.memory.buf, self._record_offset(sequence)
+        )
+        workout = WORKOUTS[self.codes[code]]
+        return workout.code, values[:workout.arity]
+
+    def compute(self, sequences: range) -> None:
+        """Compute claimed packages and publish their results."""
+
+        groups: Dict[str, List[Tuple[int, list]]] = {}
+        for sequence in sequences:
+            workout_type, data = self._package(sequence)
+            groups.setdefault(workout_type, []).append((sequence, data))
+        buffer = self.memory.buf
+        for workout_type, rows in groups.items():
+            names = WORKOUTS[workout_type].field_names
+            columns = {name: [data[index] for _, data in rows]
+                       for index, name in enumerate(names)}
+            metrics = compute_batch(workout_type, columns)
+            for position, (sequence, data) in enumerate(rows):
+                offset = self._result_offset(sequence)
+                self.result.pack_into(
+                    buffer, offset + self.status.size,
+                    columns['duration'][position],
+                    metrics['distance'][position],
+                    metrics['speed'][position],
+                    metrics['calories'][position],
+                )
+                # The status goes last: it marks the result as complete
+                self.status.pack_into(buffer, offset, sequence + 1)
+
+    def run_worker(self, batch: int = 1024, poll: float = 0.001) -> int:
+        """Compute packages until the input is closed and drained."""
+
+        computed = 0
+        while True:
+            sequences = self.claim(batch)
+            if sequences:
+                self.compute(sequences)
+                computed += len(sequences)
+            elif self._get('closed'):
+                return computed
+            else:
+                time.sleep(poll)
+
+    def collect(self, limit: Optional[int] = None) -> List[InfoMessage]:
+        """Take finished results in input order, freeing their slots."""
+
+        buffer, results = self.memory.buf, []
+        collected = self._get('collected')
+        while limit is None or len(results) < limit:
+            offset = self._result_offset(collected)
+            if self.status.unpack_from(buffer, offset)[0] != collected + 1:
+                break
+            workout_type, _ = self._package(collected)
+            results.append(InfoMessage(
+                WORKOUTS[workout_type].workout_class.__name__,
+                *self.result.unpack_from(buffer, offset + self.status.size)
+            ))
+            collected += 1
+        self._set('collected', collected)
+        return results
+
+    def close(self) -> None:
+        """Detach from the block, removing it if this ring created it."""
+
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# Profiling mode. CPU time comes from cProfile and memory from tracemalloc;
+# both are attributed to read_package, the methods of every registered
+# Training subclass and InfoMessage.get_message.
+PROFILED_METHODS = ('get_distance', 'get_mean_speed', '_mean_speed',
+                    'get_spent_calories', '_spent_calories',
+                    'show_training_info')
+
+
+def _profiled_functions() -> Dict[Any, str]:
+    """Code objects of the profiled functions and their names."""
+
+    functions = {read_package: 'read_package',
+                 InfoMessage.get_message: 'InfoMessage.get_message'}
+    for workout in WORKOUTS.values():
+        for name in PROFILED_METHODS:
+            for owner in workout.workout_class.__mro__:
+                if name in owner.__dict__:
+                    functions[owner.__dict__[name]] = (
+                        f'{owner.__name__}.{name}'
+                    )
+                    break
+    codes = {}
+    for function, name in functions.items():
+        function = getattr(function, '__wrapped__', function)
+        codes[function.__code__] = name
+    return codes
+
+
+def profile_packages(source: Iterable[Union[str, Package]],
+                     sink: Callable[[str], Any] = print,
+                     on_error: Callable[[PackageError], Any] = report_error,
+                     top: int = 10, window: int = 1000) -> Dict[str, Any]:
+    """Process packages under cProfile and tracemalloc, return a report.
+
+    Trainings, info messages and lines of the last `window` packages are
+    kept alive until the end of the run, so the allocation report shows
+    the memory each profiled function (or anything it calls) allocated
+    for them while the memory of the run stays bounded."""
+
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    codes = _profiled_functions()
+    kept: deque = deque(maxlen=window)
+    packages = 0
+    profiler = cProfile.Profile()
+    tracemalloc.start(32)
+    started = time.perf_counter()
+    profiler.enable()
+    for item in source:
+        try:
+            workout_type, data = _to_package(item)
+            training = read_package(workout_type, data)
+            info = training.show_training_info()
+            message = info.get_message()
+        except PackageError as error:
+            on_error(error)
+            continue
+        except COMPUTATION_ERRORS as error:
+            on_error(_computation_error(workout_type, error))
+            continue
+        kept.append((training, info, message))
+        packages += 1
+        sink(message)
+    profiler.disable()
+    wall = time.perf_counter() - started
+    snapshot = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    by_location = {(code.co_filename, code.co_firstlineno, code.co_name):
+                   name for code, name in codes.items()}
+    cpu = []
+    for location, (_, calls, total, cumulative, _) in pstats.Stats(
+        profiler
+    ).stats.items():
+        if location in by_location:
+            cpu.append({'function': by_location[location], 'calls': calls,
+                        'total_seconds': total,
+                        'cumulative_seconds': cumulative})
+    cpu.sort(key=lambda row: -row['cumulative_seconds'])
+
+    ranges = [(code.co_filename,
+               min(line for _, _, line in code.co_lines() if line),
+               max(line for _, _, line in code.co_lines() if line), name)
+              for code, name in codes.items()]
+    allocated: Dict[str, List[int]] = {}
+    for statistic in snapshot.statistics('traceback'):
+        # The innermost profiled function on the allocation stack
+        owner = next((name for frame in reversed(statistic.traceback)
+                      for filename, first, last, name in ranges
+                      if frame.filename == filename
+                      and first <= frame.lineno <= last), 'other')
+        totals = allocated.setdefault(owner, [0, 0])
+        totals[0] += statistic.size
+        totals[1] += statistic.count
+    memory = sorted(({'function': name, 'bytes': size, 'blocks': blocks}
+                     for name, (size, blocks) in allocated.items()),
+                    key=lambda row: -row['bytes'])
+
+    return {'packages': packages, 'retained': len(kept),
+            'wall_seconds': wall,
+            'peak_bytes': peak, 'cpu': cpu[:top] if top else cpu,
+            'memory': memory[:top] if top else memory}
+
+
+def format_profile(report: Mapping[str, Any]) -> str:
+    """Human-readable top-N summary of a `profile_packages` report."""
+
+    lines = [f"{report['packages']} packages in "
+             f"{report['wall_seconds']:.3f}s, "
+             f"peak traced memory {report['peak_bytes']} B",
+             f"{'cumulative s':>12} {'own s':>10} {'calls':>9}  function"]
+    for row in report['cpu']:
+        lines.append(f"{row['cumulative_seconds']:12.6f} "
+                     f"{row['total_seconds']:10.6f} {row['calls']:9d}  "
+                     f"{row['function']}")
+    lines.append(f"{'bytes':>12} {'blocks':>10}  function, held by the "
+                 f"last {report['retained']} packages")
+    for row in report['memory']:
+        lines.append(f"{row['bytes']:12d} {row['blocks']:10d}  "
+                     f"{row['function']}")
+    return '\n'.join(lines)
+
+
+SAMPLE_PACKAGES = [
+    # num_of_strokes, time_in_hrs, user_weight,
+    # pool_len, num_of_pools_covered
+    ('SWM', [720, 1, 80, 25, 40]),
+    # num_of_steps, time_in_hrs, user_weight
+    ('RUN', [15000, 1, 75]),
+    # num_of_steps, time_in_hrs, user_weight, user_len
+    ('WLK', [9000, 1, 75, 180]),
+]
+
+
+def cli(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, return the exit status."""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='homework',
+        description='Print info messages about trainings '
+                    'from sensor packages.'
+    )
+    parser.add_argument('files', nargs='*', metavar='FILE',
+                        help="file with a CODE,v1,v2,... package per line, "
+                             "'-' for stdin")
+    parser.add_argument('-p', '--package', action='append', default=[],
+                        metavar='CODE,V1,V2,...',
+                        help='a package given inline, may be repeated')
+    parser.add_argument('--profile', metavar='REPORT',
+                        help='profile CPU time and allocations, write a '
+                             'JSON report to REPORT and a summary to '
+                             'stderr')
+    parser.add_argument('--top', type=int, default=10,
+                        help='rows in the profile summary (default: 10)')
+    args = parser.parse_args(argv)
+
+    if not args.files and not args.package and not args.profile:
+        for workout_type, data in SAMPLE_PACKAGES:
+            training = read_package(workout_type, data)
+            # Passing of Training class instance to the main function
+            main(training)
+        return 0
+
+    errors: List[PackageError] = []
+
+    def on_error(error: PackageError) -> None:
+        errors.append(error)
+        report_error(error)
+
+    source: Iterable[Union[str, Package]] = chain(
+        args.package, chain.from_iterable(map(read_lines, args.files))
+    )
+    if not args.profile:
+        run_pipeline(source, on_error=on_error)
+        return 1 if errors else 0
+
+    import json
+
+    if not args.files and not args.package:
+        source = SAMPLE_PACKAGES
+    report = profile_packages(source, on_error=on_error, top=args.top)
+    with open(args.profile, 'w', encoding='utf-8') as stream:
+        json.dump(report, stream, indent=2)
+    print(format_profile(report), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -1,3 +1,10 @@
+import asyncio
+import csv
+import io
+import json
+import subprocess
+import sys
+import time
 import pytest
 import types
 import inspect
@@ -384,3 +391,1011 @@ def test_main_output(input_data, expected):
     assert get_message_output == expected, (
         'Метод `main` должен печатать результат в консоль.\n'
     )
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    """Run a test on the NumPy kernels and on the pure-Python fallback."""
+
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(homework, '_numpy_module', None)
+    return request.param
+
+
+@pytest.mark.parametrize('workout_type, rows', [
+    ('SWM', [[720, 1, 80, 25, 40], [420, 4, 20, 42, 4], [1206, 12, 6, 12, 6]]),
+    ('RUN', [[15000, 1, 75], [420, 4, 20], [1206, 12, 6]]),
+    ('WLK', [[9000, 1, 75, 180], [420, 4, 20, 42], [1206, 12, 6, 12]]),
+])
+def test_compute_batch(backend, workout_type, rows):
+    names = [field.name for field in homework.fields(
+        homework.WORKOUTS[workout_type].workout_class
+    )]
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+    result = homework.compute_batch(workout_type, columns)
+    for i, row in enumerate(rows):
+        training = homework.read_package(workout_type, row)
+        assert result['distance'][i] == training.get_distance()
+        assert result['speed'][i] == training.get_mean_speed()
+        assert result['calories'][i] == training.get_spent_calories(), (
+            'Пакетный расчёт должен совпадать с расчётом по объектам.'
+        )
+
+
+def test_compute_batch_unknown_type():
+    with pytest.raises(KeyError):
+        homework.compute_batch('XXX', {})
+
+
+def test_compute_batch_lengths(backend):
+    with pytest.raises(ValueError):
+        homework.compute_batch('RUN', {'action': [15000, 9000, 1000],
+                                       'duration': [1], 'weight': [75, 80]})
+
+
+def test_parse_package():
+    assert homework.parse_package('WLK, 9000,1.5,75,180') == (
+        'WLK', [9000, 1.5, 75, 180]
+    )
+
+
+def test_run_pipeline():
+    source = io.StringIO(
+        '# code,values\n'
+        'SWM,720,1,80,25,40\n'
+        '\n'
+        'RUN,1206,12,6\n'
+    )
+    stats = homework.PipelineStats()
+    output = []
+    count = homework.run_pipeline(
+        homework.read_lines(source), output.append, stats
+    )
+    assert count == 2
+    expected = [
+        homework.read_package(*package).show_training_info().get_message()
+        for package in [('SWM', [720, 1, 80, 25, 40]), ('RUN', [1206, 12, 6])]
+    ]
+    assert output == expected, (
+        'Конвейер должен выдавать те же сообщения, что и `main`.'
+    )
+    for name in homework.PipelineStats.STAGES:
+        assert stats.stages[name].items == 2
+
+    output, errors = [], []
+    count = homework.run_pipeline(
+        ['RUN,1,0,75', 'RUN,1206,12,6'], output.append,
+        on_error=errors.append
+    )
+    assert count == 1 and output == expected[1:], (
+        'Пакет с нулевой длительностью должен пропускаться.'
+    )
+    assert [error.workout_type for error in errors] == ['RUN']
+
+    for stats in (None, homework.PipelineStats()):
+        output, errors = [], []
+        count = homework.run_pipeline(
+            ['WLK,1e200,1,75,180', 'RUN,1206,12,6'], output.append, stats,
+            on_error=errors.append
+        )
+        assert count == 1 and output == expected[1:], (
+            'Ошибка расчёта не должна останавливать конвейер.'
+        )
+        assert isinstance(errors[0], homework.PackageError)
+        assert errors[0].workout_type == 'WLK'
+
+
+def test_stream_messages_is_lazy():
+    def endless():
+        while True:
+            yield ('RUN', [15000, 1, 75])
+
+    messages = homework.stream_messages(endless())
+    assert next(messages) == next(messages)
+
+
+def test_TrainingTable(backend):
+    rows = [[720, 1, 80, 25, 40], [420, 4, 20, 42, 4]]
+    table = homework.TrainingTable('SWM', rows)
+    assert len(table) == 2
+    for index, row in enumerate(rows):
+        expected = homework.Swimming(*row).show_training_info()
+        assert table.show_training_info(index) == expected
+    assert list(table.iter_info()) == [
+        homework.Swimming(*row).show_training_info() for row in rows
+    ]
+    with pytest.raises(ValueError):
+        table.append([1, 2, 3])
+
+    table = homework.TrainingTable('WLK', [[15000.0, 1, 75, 180.5]])
+    assert table.show_training_info(0) == homework.read_package(
+        'WLK', [15000.0, 1, 75, 180.5]
+    ).show_training_info(), 'Таблица должна принимать дробные значения.'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_process_packages(workers):
+    packages = [
+        ('SWM', [720, 1, 80, 25, 40]),
+        ('XXX', [1, 2, 3]),
+        ('RUN', [15000, 1, 75]),
+        ('WLK', [9000, 1, 75]),
+        ('WLK', [9000, 1, 75, 180]),
+        ('RUN', [1, 0, 1]),
+        ('RUN', [1, 'x', 1]),
+    ]
+    result = homework.process_packages(packages, workers=workers,
+                                       chunk_size=2)
+    assert len(result) == len(packages)
+    for (workout_type, data), item in zip(packages, result):
+        if isinstance(item, homework.PackageError):
+            assert item.workout_type == workout_type
+            continue
+        expected = homework.read_package(workout_type, data)
+        assert item == expected.show_training_info(), (
+            '`process_packages` должна сохранять порядок пакетов.'
+        )
+    assert [isinstance(item, homework.PackageError) for item in result] == [
+        False, True, False, True, False, True, True,
+    ]
+    assert isinstance(result[1], KeyError)
+
+
+def test_render_messages():
+    infos = [
+        homework.read_package(*package).show_training_info()
+        for package in [('SWM', [720, 1, 80, 25, 40]),
+                        ('RUN', [1206, 12, 6]),
+                        ('WLK', [9000, 1, 75, 180])]
+    ]
+    expected = [info.get_message() for info in infos]
+    assert homework.render_messages(infos) == expected, (
+        'Пакетный вывод должен совпадать с `get_message`.'
+    )
+    stream = io.StringIO()
+    assert homework.write_messages(infos, stream, chunk_size=2) == 3
+    assert stream.getvalue() == ''.join(line + '\n' for line in expected)
+    assert homework.render_columns(
+        'Running', [12], [0.7839], [0.065325], [-81.320328]
+    ) == [expected[1]]
+
+
+@pytest.mark.parametrize('input_data', [
+    ('SWM', [720, 1, 80, 25, 40]),
+    ('RUN', [15000, 1, 75]),
+    ('WLK', [9000, 1, 75, 180]),
+])
+def test_show_training_info_computes_once(monkeypatch, input_data):
+    training = homework.read_package(*input_data)
+    expected = homework.InfoMessage(
+        type(training).__name__, training.duration, training.get_distance(),
+        training.get_mean_speed(), training.get_spent_calories()
+    )
+    calls = []
+    get_distance = homework.Training.get_distance
+
+    def counting_get_distance(self):
+        calls.append(self)
+        return get_distance(self)
+
+    monkeypatch.setattr(homework.Training, 'get_distance',
+                        counting_get_distance)
+    assert training.show_training_info() == expected
+    assert len(calls) == 1, (
+        'Дистанция должна вычисляться один раз за вызов.'
+    )
+
+
+def test_metrics_follow_attributes():
+    running = homework.Running(15000, 1, 75)
+    calories = running.get_spent_calories()
+    running.weight = 150
+    assert running.get_spent_calories() == 2 * calories
+    running.action = 9000
+    assert running.get_distance() == 5.85
+
+    @homework.dataclass
+    class Treadmill(homework.Running):
+        """Running with the weight given in pounds."""
+
+        @property
+        def pounds(self):
+            return self.weight / 0.45
+
+        @pounds.setter
+        def pounds(self, value):
+            self.weight = value * 0.45
+
+    treadmill = Treadmill(15000, 1, 75)
+    treadmill.get_spent_calories()
+    treadmill.pounds = 300
+    assert treadmill.weight == 135 and 'pounds' not in vars(treadmill), (
+        'Присваивание должно проходить через дескрипторы подклассов.'
+    )
+    assert treadmill.get_spent_calories() == homework.Running(
+        15000, 1, 135
+    ).get_spent_calories()
+
+
+@pytest.mark.parametrize('packages', [
+    [('RUN', [15000, 1, 75]), ('RUN', [1206, 12.0, 6])],
+    [('SWM', [720, 1, 80, 25, 40]), ('WLK', [9000, 1, 75, 180]),
+     ('SWM', [420, 4, 20, 42, 4])],
+    [('WLK', [9000, 1, 75, 180.5]), ('WLK', [15000.0, 1.5, 80, 170])],
+])
+def test_PacketFile(backend, tmp_path, packages):
+    path = tmp_path / 'packets.bin'
+    with open(path, 'wb') as stream:
+        assert homework.write_packets(stream, packages) == len(packages)
+    with homework.PacketFile(str(path)) as packets:
+        assert list(packets) == packages
+        computed = packets.compute()
+        offsets = dict.fromkeys(computed, 0)
+        for workout_type, data in packages:
+            expected = homework.read_package(workout_type, data)
+            index = offsets[workout_type]
+            offsets[workout_type] += 1
+            assert (computed[workout_type]['calories'][index]
+                    == expected.get_spent_calories())
+        del computed
+
+
+def test_PackageServer():
+    lines = ['SWM,720,1,80,25,40', 'XXX,1,2', 'RUN,15000,1,75', 'WLK,a,b']
+
+    async def session():
+        server = homework.PackageServer(concurrency=2, queue_size=2)
+        await server.start()
+        host, port = server.address[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(''.join(line + '\n' for line in lines).encode())
+        writer.write_eof()
+        replies = [raw.decode().rstrip('\n') async for raw in reader]
+        writer.close()
+        await server.close()
+        return replies, server.metrics()
+
+    replies, metrics = asyncio.run(session())
+    assert replies[0] == homework.read_package(
+        'SWM', [720, 1, 80, 25, 40]
+    ).show_training_info().get_message()
+    assert replies[1].startswith('ERROR: ')
+    assert replies[2].startswith('Тип тренировки: Running;')
+    assert replies[3].startswith('ERROR: ')
+    assert metrics['requests'] == 4
+    assert metrics['errors'] == 2
+    assert 0 <= metrics['p50'] <= metrics['p99']
+
+
+def test_PackageServer_survives_failing_lines(monkeypatch):
+    reply_to_line = homework.reply_to_line
+
+    def failing(line):
+        if line == 'BOOM':
+            raise RuntimeError('boom')
+        return reply_to_line(line)
+
+    monkeypatch.setattr(homework, 'reply_to_line', failing)
+    lines = ['RUN,15000,0,75', 'BOOM', 'RUN,15000,1,75']
+
+    async def session():
+        server = homework.PackageServer(concurrency=1, queue_size=1)
+        await server.start()
+        host, port = server.address[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(''.join(line + '\n' for line in lines).encode())
+        writer.write_eof()
+        replies = [raw.decode().rstrip('\n') async for raw in reader]
+        writer.close()
+        await server.close()
+        return replies
+
+    replies = asyncio.run(asyncio.wait_for(session(), timeout=10))
+    assert replies[:2] == ['ERROR: Sorry, duration must be positive.',
+                           'ERROR: boom']
+    assert replies[2].startswith('Тип тренировки: Running;'), (
+        'Ошибка в одной строке не должна останавливать обработчик сервера.'
+    )
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert homework.percentile(values, 0.99) == 99
+    assert homework.percentile(values, 0.07) == 7
+    assert homework.percentile(values, 1.0) == 100
+    assert homework.percentile(values, 0.0) == 1
+    assert homework.percentile([1, 2], 0.5) == 1, (
+        'Перцентиль должен считаться по ближайшему рангу.'
+    )
+    assert homework.percentile([], 0.5) == 0.0
+
+
+def test_Instrumentation():
+    read_package = homework.read_package
+    get_message = homework.InfoMessage.get_message
+    packages = [('SWM', [720, 1, 80, 25, 40]), ('RUN', [15000, 1, 75]),
+                ('RUN', [1206, 12, 6])]
+    with homework.Instrumentation() as instrumentation:
+        output = []
+        homework.run_pipeline(packages, output.append)
+    assert homework.read_package is read_package
+    assert homework.InfoMessage.get_message is get_message, (
+        'После выхода из контекста функции должны быть восстановлены.'
+    )
+    snapshot = instrumentation.snapshot()
+    for hook in homework.Instrumentation.HOOKS:
+        assert snapshot[hook]['RUN']['count'] == 2
+        assert snapshot[hook]['SWM']['count'] == 1
+    text = instrumentation.prometheus()
+    assert ('homework_latency_seconds_count'
+            '{hook="get_message",workout="RUN"} 2') in text
+
+
+def test_Instrumentation_plugins(monkeypatch):
+    monkeypatch.setattr(homework, 'WORKOUTS', dict(homework.WORKOUTS))
+
+    @homework.register_workout('TRD')
+    @homework.dataclass
+    class Treadmill(homework.Running):
+        """Training type: running on a treadmill."""
+
+    with homework.Instrumentation() as instrumentation:
+        homework.run_pipeline([('TRD', [15000, 1, 75]),
+                               ('RUN', [15000, 1, 75])], lambda line: None)
+    calories = instrumentation.snapshot()['get_spent_calories']
+    assert calories['TRD']['count'] == calories['RUN']['count'] == 1, (
+        'Унаследованные методы плагинов тоже должны учитываться.'
+    )
+
+    read_package = homework.read_package
+    monkeypatch.setattr(homework, 'InfoMessage', type('InfoMessage', (), {}))
+    with pytest.raises(KeyError):
+        homework.Instrumentation().__enter__()
+    assert homework.read_package is read_package, (
+        'Неудачное включение должно снимать уже установленные обёртки.'
+    )
+    monkeypatch.undo()
+    with homework.Instrumentation():
+        pass
+
+
+def test_SessionAggregator(tmp_path):
+    day = 86400
+    aggregator = homework.SessionAggregator(window=day, retention=2)
+    running = homework.Running(15000, 1, 75).show_training_info()
+    walking = homework.SportsWalking(9000, 1, 75, 180).show_training_info()
+    aggregator.add('alice', running, 0)
+    aggregator.add('alice', walking, 10)
+    aggregator.add('alice', running, day + 10)
+    aggregator.add('bob', running, day + 20)
+
+    totals = aggregator.totals('alice', 'Running')
+    assert totals.count == 2
+    assert totals.calories == 2 * running.calories
+    assert totals.mean_speed == running.speed
+    assert aggregator.totals(training_type='Running').count == 3
+
+    path = str(tmp_path / 'state.json')
+    aggregator.checkpoint(path)
+    restored = homework.SessionAggregator.restore(path)
+    assert restored.totals('alice') == aggregator.totals('alice'), (
+        'Состояние агрегатора должно восстанавливаться из файла.'
+    )
+
+    assert restored.expire(2 * day) == 1
+    assert restored.totals('alice').count == 1
+
+
+@pytest.mark.parametrize('input_data', [
+    ('XXX', [1, 2, 3]),
+    ('RUN', [15000, 1]),
+    ('SWM', [720, 1, 80, 25, 40, 1]),
+    ('RUN', [15000, 0, 75]),
+    ('WLK', [9000, 1, 75, 0]),
+    ('SWM', [-720, 1, 80, 25, 40]),
+    ('RUN', [float('inf'), 1, 75]),
+    ('WLK', [9000, 1, 75, float('nan')]),
+])
+def test_validate_package(input_data):
+    error = homework.validate_package(*input_data)
+    assert isinstance(error, homework.PackageError)
+    assert error.workout_type == input_data[0]
+    with pytest.raises(homework.PackageError):
+        homework.read_package(*input_data)
+
+
+def test_register_workout(monkeypatch):
+    monkeypatch.setattr(homework, 'WORKOUTS', dict(homework.WORKOUTS))
+
+    @homework.register_workout('CYC')
+    @homework.dataclass
+    class Cycling(homework.Training):
+        """Training type: cycling."""
+
+        LEN_STEP = 5.0
+
+        action: int
+        duration: float
+        weight: float
+
+        def get_spent_calories(self):
+            return self.get_mean_speed() * self.weight
+
+    training = homework.read_package('CYC', [6000, 2, 80])
+    assert isinstance(training, Cycling)
+    assert training.show_training_info().calories == 15 * 80
+    assert homework.compute_batch(
+        'CYC', {'action': [6000], 'duration': [2], 'weight': [80]}
+    )['calories'][0] == 15 * 80
+    assert homework.validate_package('CYC', [1, 2]) is not None
+    assert homework.WORKOUTS['CYC'].direct
+
+    @homework.register_workout('ROW')
+    @homework.dataclass
+    class Rowing(Cycling):
+        """Training type: rowing, with laps filled in after __init__."""
+
+        laps: list = homework.field(default_factory=list, init=False)
+
+    training = homework.read_package('ROW', [6000, 2, 80])
+    assert training.laps == [], (
+        'Поля с default_factory должны заполняться при создании тренировки'
+    )
+    assert not homework.WORKOUTS['ROW'].direct
+
+    @homework.register_workout('SKI')
+    @homework.dataclass(init=False)
+    class Skiing(Cycling):
+        """Training type: skiing, with the duration given in minutes."""
+
+        def __init__(self, action, duration, weight):
+            super().__init__(action, duration / 60, weight)
+
+    training = homework.read_package('SKI', [6000, 120, 80])
+    assert training.duration == 2, (
+        'Собственный __init__ плагина должен вызываться'
+    )
+
+
+def test_csv_files(tmp_path):
+    packages = [('SWM', [720, 1, 80, 25, 40]), ('RUN', [15000, 1, 75]),
+                ('RUN', [1206, 12, 6]), ('WLK', [9000, 1, 75, 180])]
+    source = tmp_path / 'packages.csv'
+    source.write_text('\n'.join(
+        ','.join(map(str, [code] + data)) + '\n' for code, data in packages
+    ))
+    tables = homework.read_packages_csv(str(source))
+    assert {code: len(table) for code, table in tables.items()} == {
+        'SWM': 1, 'RUN': 2, 'WLK': 1
+    }, 'Пустые строки CSV должны пропускаться.'
+    quoted = tmp_path / 'quoted.csv'
+    quoted.write_text('"RUN", "15000","1",75\n \n')
+    assert list(homework.read_packages_csv(str(quoted))['RUN'].iter_info()) == [
+        homework.read_package('RUN', [15000, 1, 75]).show_training_info()
+    ], 'Ячейки в кавычках должны читаться.'
+    for bad_row in ['RUN,15000,1', 'RUN,a,1,75', 'RUN,15000,0,75', 'XXX,1',
+                    'RUN,inf,1,75']:
+        broken = tmp_path / 'broken.csv'
+        broken.write_text(f'RUN,1206,12,6\n{bad_row}\n')
+        with pytest.raises(homework.PackageError):
+            homework.read_packages_csv(str(broken))
+
+    infos = [homework.read_package(*package).show_training_info()
+             for package in packages]
+    by_messages = tmp_path / 'messages.csv'
+    assert homework.write_messages_csv(str(by_messages), infos) == 4
+    by_tables = tmp_path / 'tables.csv'
+    assert homework.write_tables_csv(str(by_tables), tables.values()) == 4
+    with open(by_messages, newline='') as stream:
+        rows = list(csv.reader(stream))
+    assert tuple(rows[0]) == homework.MESSAGE_COLUMNS
+    assert rows[1] == ['Swimming', '1', repr(infos[0].distance),
+                       repr(infos[0].speed), repr(infos[0].calories)]
+    with open(by_tables, newline='') as stream:
+        table_rows = list(csv.reader(stream))
+    assert sorted(float(row[4]) for row in table_rows[1:]) == sorted(
+        info.calories for info in infos
+    ), 'Запись таблиц должна совпадать с расчётом по объектам.'
+
+
+def test_parquet_files(backend, tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    packages = [('SWM', [720, 1, 80, 25, 40]), ('RUN', [15000, 1, 75]),
+                ('RUN', [1206, 12, 6]), ('WLK', [9000, 1, 75, 180.5])]
+    names = ['action', 'duration', 'weight', 'height', 'length_pool',
+             'count_pool']
+    source = str(tmp_path / 'packages.parquet')
+    pq.write_table(pa.table({
+        'workout_type': [code for code, _ in packages],
+        **{name: [
+            dict(zip(homework.WORKOUTS[code].field_names, data)).get(name)
+            for code, data in packages
+        ] for name in names},
+    }), source)
+
+    tables = homework.read_packages_parquet(source)
+    csv_path = tmp_path / 'packages.csv'
+    csv_path.write_text(''.join(
+        ','.join(map(str, [code] + data)) + '\n' for code, data in packages
+    ))
+    by_csv = homework.read_packages_csv(str(csv_path))
+    assert all(isinstance(table, homework.TrainingTable)
+               for table in tables.values())
+    assert {code: list(table.iter_info()) for code, table in tables.items()
+            } == {code: list(table.iter_info())
+                  for code, table in by_csv.items()}, (
+        'Parquet и CSV должны давать одинаковые таблицы.'
+    )
+
+    path = str(tmp_path / 'sessions.parquet')
+    assert homework.write_tables_parquet(path, tables.values()) == 4
+    written = pq.read_table(path).to_pydict()
+    infos = [homework.read_package(*package).show_training_info()
+             for package in packages]
+    assert sorted(written['calories']) == sorted(
+        info.calories for info in infos
+    ), 'Запись Parquet должна совпадать с расчётом по объектам.'
+
+    pq.write_table(pa.table({'workout_type': ['RUN'], 'action': [15000],
+                             'duration': [None], 'weight': [75.0]}),
+                   source)
+    with pytest.raises(homework.PackageError):
+        homework.read_packages_parquet(source)
+
+
+def test_PackageCache(tmp_path):
+    now = [0.0]
+    backend = homework.SqliteCacheBackend(str(tmp_path / 'cache.db'))
+    cache = homework.PackageCache(maxsize=2, ttl=10, backend=backend,
+                                  clock=lambda: now[0])
+    expected = homework.read_package(
+        'RUN', [15000, 1, 75]
+    ).show_training_info()
+    assert cache.get_info('RUN', [15000, 1, 75]) == expected
+    assert cache.get_message('RUN', (15000, 1, 75)) == expected.get_message()
+    assert cache.stats()['hits'] == 1
+
+    cache.get_info('SWM', [720, 1, 80, 25, 40])
+    cache.get_info('WLK', [9000, 1, 75, 180])
+    assert cache.stats() == {'hits': 1, 'misses': 3,
+                             'evictions': 1, 'size': 2}
+
+    restarted = homework.PackageCache(ttl=10, backend=backend,
+                                      clock=lambda: now[0])
+    assert restarted.get_info('RUN', [15000, 1, 75]) == expected
+    assert restarted.stats()['hits'] == 1, (
+        'Кэш должен переживать перезапуск через дисковое хранилище.'
+    )
+    assert restarted.get_info('RUN', [15000.0, 1, 75.0]) == expected
+    assert len(backend) == 3, 'Равные значения должны давать один ключ.'
+    now[0] = 11.0
+    restarted.get_info('RUN', [15000, 1, 75])
+    assert restarted.stats()['misses'] == 1
+    homework.PackageCache(ttl=10, backend=backend, clock=lambda: now[0])
+    assert len(backend) == 1, 'Просроченные записи должны удаляться.'
+
+    recalibrated = homework.PackageCache(backend=backend, version='v2')
+    assert recalibrated.get_info('RUN', [15000, 1, 75]) == expected
+    assert recalibrated.stats()['misses'] == 1, (
+        'Результаты других коэффициентов не должны браться с диска.'
+    )
+    backend.close()
+
+    backend = homework.SqliteCacheBackend(str(tmp_path / 'small.db'),
+                                          max_rows=2)
+    cache = homework.PackageCache(maxsize=1, backend=backend)
+    for action in range(1000, 1010):
+        cache.get_info('RUN', [action, 1, 75])
+    assert len(backend) == 2, 'Дисковый кэш должен быть ограничен.'
+    backend.close()
+
+
+def test_main_with_sink():
+    memory = homework.MemorySink()
+    with homework.ThreadedSink(memory, batch_size=2) as sink:
+        for package in [('SWM', [720, 1, 80, 25, 40]),
+                        ('RUN', [15000, 1, 75]),
+                        ('WLK', [9000, 1, 75, 180])]:
+            homework.main(homework.read_package(*package), sink)
+    with Capturing() as printed:
+        for package in [('SWM', [720, 1, 80, 25, 40]),
+                        ('RUN', [15000, 1, 75]),
+                        ('WLK', [9000, 1, 75, 180])]:
+            homework.main(homework.read_package(*package))
+    assert memory.lines == list(printed), (
+        'Вывод через sink должен совпадать с выводом `main`.'
+    )
+
+
+def test_RotatingFileSink(tmp_path):
+    path = str(tmp_path / 'out.log')
+    lines = [f'line {index}' for index in range(100)]
+    with homework.ThreadedSink(
+        homework.RotatingFileSink(path, max_bytes=200, backup_count=100),
+        batch_size=10,
+    ) as sink:
+        for line in lines:
+            sink(line)
+    files = sorted(tmp_path.iterdir(), key=lambda item: (
+        -int(item.suffix[1:]) if item.suffix[1:].isdigit() else 0
+    ))
+    written = ''.join(item.read_text() for item in files).splitlines()
+    assert written == lines
+
+
+def test_ThreadedSink_error():
+    class Broken(homework.MemorySink):
+        def write_lines(self, lines):
+            raise OSError('broken pipe')
+
+    sink = homework.ThreadedSink(Broken(), batch_size=1)
+    sink.write('line')
+    with pytest.raises(OSError):
+        sink.close()
+
+
+def test_ThreadedSink_flushed_at_exit():
+    code = ('import homework; '
+            'sink = homework.ThreadedSink(batch_size=2); '
+            '[sink.write(str(index)) for index in range(5)]')
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=homework.os.path.dirname(homework.__file__),
+        capture_output=True, text=True, check=True, timeout=30,
+    )
+    assert result.stdout.split() == ['0', '1', '2', '3', '4'], (
+        'Незакрытый ThreadedSink должен дописать строки при выходе.'
+    )
+
+
+def test_import_is_lazy():
+    lazy = ['asyncio', 'concurrent.futures', 'csv', 'json', 'mmap',
+            'multiprocessing', 'numpy', 'pyarrow', 'queue', 'sqlite3',
+            'struct', 'threading']
+    code = ('import sys, homework; '
+            f'print([name for name in {lazy!r} if name in sys.modules])')
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=homework.os.path.dirname(homework.__file__),
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == '[]', (
+        'Импорт `homework` не должен загружать тяжёлые модули.'
+    )
+
+
+def test_import_time(tmp_path):
+    # Compiled once into a private cache first, so that the runs below
+    # measure a warm import as in production, not the bytecode compiler
+    env = dict(homework.os.environ, PYTHONPYCACHEPREFIX=str(tmp_path))
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    def import_time():
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import homework'],
+            cwd=homework.os.path.dirname(homework.__file__), env=env,
+            capture_output=True, text=True, check=True,
+        )
+        for line in result.stderr.splitlines():
+            *_, cumulative, name = line.split('|')
+            if name.strip() == 'homework':
+                return int(cumulative)
+        raise AssertionError('homework is missing from -X importtime')
+
+    import_time()
+    best = min(import_time() for _ in range(3))
+    # About 30 ms here, two thirds of it dataclasses and typing; eager
+    # asyncio or NumPy imports alone would add 35-100 ms more
+    assert best < 100_000, (
+        f'Импорт `homework` занимает {best} мкс, это слишком долго.'
+    )
+
+
+def test_cli(tmp_path):
+    path = tmp_path / 'packages.txt'
+    path.write_text('SWM,720,1,80,25,40\n')
+    with Capturing() as output:
+        status = homework.cli(['-p', 'RUN,15000,1,75', str(path)])
+    assert status == 0
+    assert output == [
+        homework.read_package(*package).show_training_info().get_message()
+        for package in [('RUN', [15000, 1, 75]), ('SWM', [720, 1, 80, 25, 40])]
+    ]
+    with Capturing() as output:
+        assert homework.cli([]) == 0
+    assert len(output) == len(homework.SAMPLE_PACKAGES)
+    assert homework.cli(['-p', 'XXX,1']) == 1
+
+
+def test_validate_columns(backend):
+    columns = {
+        'action': [15000, 9000, 1000, 200000, 420],
+        'duration': [1, 0, 1, 1, 4],
+        'weight': [75, 80, -1, 75, 20],
+        'height': [180, 170, 175, 180, 0],
+    }
+    result = homework.validate_columns('WLK', columns)
+    assert result.valid_index == [0]
+    assert result.valid == {'action': [15000], 'duration': [1],
+                            'weight': [75], 'height': [180]}
+    assert result.rejected == {
+        1: ['duration must be positive'],
+        2: ['weight must be positive'],
+        3: ['speed above 15 km/h'],
+        4: ['height must be positive'],
+    }, 'Некорректные пакеты должны отбраковываться с причинами.'
+    homework.compute_batch('WLK', result.valid)
+
+    result = homework.validate_columns('RUN', {
+        'action': [15000, float('inf')], 'duration': [1, 1],
+        'weight': [75, 75],
+    })
+    assert result.rejected == {1: ['action must be finite']}, (
+        'Бесконечные значения должны отбраковываться.'
+    )
+
+
+def test_ShardedJob(tmp_path):
+    lines = ['SWM,720,1,80,25,40', 'RUN,15000,1,75', 'XXX,1',
+             'WLK,9000,1,75,180', 'RUN,1206,12,6']
+    job = homework.ShardedJob(str(tmp_path / 'job'), lease=60)
+    assert job.prepare(lines, shard_size=2) == 3
+    assert job.status() == {'total': 3, 'done': 0,
+                            'claimed': 0, 'pending': 3}
+
+    # A crashed worker leaves its claim behind
+    abandoned = job.claim('crashed')
+    stale = time.time() - 120
+    homework.os.utime(job._path('claims', abandoned), (stale, stale))
+
+    assert job.run_local(workers=2) == 3
+    assert job.status() == {'total': 3, 'done': 3,
+                            'claimed': 0, 'pending': 0}
+    assert list(job.results()) == [
+        homework.reply_to_line(line) for line in lines
+    ], 'Шарды должны обрабатываться полностью и по порядку.'
+    assert job.run_worker('late') == 0
+
+
+def test_ShardedJob_failing_lines(tmp_path, monkeypatch):
+    reply_to_line = homework.reply_to_line
+
+    def failing(line):
+        if line.startswith('BOOM'):
+            raise RuntimeError('boom')
+        return reply_to_line(line)
+
+    monkeypatch.setattr(homework, 'reply_to_line', failing)
+    job = homework.ShardedJob(str(tmp_path / 'job'))
+    job.prepare(['RUN,15000,0,75', 'BOOM', 'RUN,15000,1,75'], shard_size=2)
+    assert job.run_worker('only') == 2
+    assert job.status() == {'total': 2, 'done': 2,
+                            'claimed': 0, 'pending': 0}
+    results = list(job.results())
+    assert results[:2] == ['ERROR: Sorry, duration must be positive.',
+                           'ERROR: boom'], (
+        'Ошибочные строки шарда должны давать ответ ERROR.'
+    )
+    assert results[2].startswith('Тип тренировки: Running;')
+    assert not list((tmp_path / 'job' / 'done').glob('*.tmp'))
+
+
+def test_CoefficientProfile(backend, tmp_path):
+    path = tmp_path / 'profiles.json'
+    path.write_text(
+        '{"base": {}, '
+        '"v2": {"RUN": {"RUN_CAL_COEFF_1": 20}, "SWM": {"LEN_STEP": 1.5}}}'
+    )
+    profiles = homework.load_profiles(str(path))
+    columns = {'action': [15000, 9000], 'duration': [1, 2],
+               'weight': [75, 80]}
+    result = homework.compute_profiles('RUN', columns, profiles.values())
+    for index, row in enumerate(zip(*columns.values())):
+        base = homework.Running(*row)
+        assert result['base']['calories'][index] == base.get_spent_calories()
+        assert base.get_spent_calories() < profiles['v2'].apply(
+            base
+        ).get_spent_calories()
+        assert result['v2']['calories'][index] == base.get_spent_calories(), (
+            'Пакетный и поштучный расчёт должны совпадать для профиля.'
+        )
+    assert homework.Running.RUN_CAL_COEFF_1 == 18
+
+    training = homework.Running(15000, 1, 75)
+    calories = training.get_spent_calories()
+    assert profiles['v2'].apply(training).get_spent_calories() > calories
+    assert profiles['base'].apply(training).get_spent_calories() == (
+        calories
+    ), 'Профиль должен заменять коэффициенты предыдущего профиля.'
+    assert type(training) is homework.Running
+    assert 'RUN_CAL_COEFF_1' not in vars(training)
+    with pytest.raises(ValueError):
+        homework.CoefficientProfile('bad', {'RUN': {'NOPE': 1}})
+
+
+def test_QuantileSketch():
+    import random
+
+    generator = random.Random(0)
+    values = [generator.lognormvariate(0, 2) * generator.choice([-1, 1])
+              for _ in range(5000)] + [0.0] * 100
+    first, second = (homework.QuantileSketch(0.01) for _ in range(2))
+    for value in values[:2000]:
+        first.add(value)
+    for value in values[2000:]:
+        second.add(value)
+    first.merge(homework.QuantileSketch.from_dict(second.as_dict()))
+
+    ordered = sorted(values)
+    for fraction in (0, 0.01, 0.25, 0.5, 0.9, 0.99, 1):
+        exact = ordered[int(fraction * (len(ordered) - 1))]
+        estimate = first.quantile(fraction)
+        assert abs(estimate - exact) <= 0.01 * abs(exact), (
+            'Оценка квантиля должна укладываться в относительную ошибку.'
+        )
+
+
+def test_SessionSummary():
+    left, right = homework.SessionSummary(), homework.SessionSummary()
+    for index, action in enumerate(range(1000, 21000, 1000)):
+        summary = left if index % 2 else right
+        summary.add(homework.Running(action, 1, 75).show_training_info())
+    left.merge(right)
+    quantiles = left.quantiles('Running', 'speed', (0, 0.5, 1))
+    assert quantiles[0] == homework.Running(1000, 1, 75).get_mean_speed()
+    assert quantiles[1] == homework.Running(20000, 1, 75).get_mean_speed()
+    median = homework.Running(10000, 1, 75).get_mean_speed()
+    assert abs(quantiles[0.5] - median) <= 0.01 * median
+
+
+@pytest.mark.parametrize('workout_type, static, samples, expected', [
+    ('RUN', {'weight': 75}, [(5, 1.0)] * 3600, [18000, 1.0, 75]),
+    ('WLK', {'weight': 75, 'height': 180}, [(150, 60.0)] * 60,
+     [9000, 1.0, 75, 180]),
+    ('SWM', {'weight': 80, 'length_pool': 25},
+     [(12, 60.0, 1)] * 30 + [(12, 60.0, 0)] * 30,
+     [720, 1.0, 80, 25, 30]),
+])
+def test_SessionAccumulator(workout_type, static, samples, expected):
+    session = homework.SessionAccumulator(workout_type, **static)
+    session.add_many(samples[:len(samples) // 2])
+    half = session.partial()
+    assert half.duration == 0.5
+    session.add_many(samples[len(samples) // 2:])
+    assert session.finalize() == homework.read_package(
+        workout_type, expected
+    ).show_training_info(), (
+        'Итог накопленной сессии должен совпадать с пакетным расчётом.'
+    )
+    with pytest.raises(RuntimeError):
+        session.add(1)
+
+
+def test_SessionStore(tmp_path):
+    running = homework.Running(15000, 1, 75).show_training_info()
+    walking = homework.SportsWalking(9000, 1, 75, 180).show_training_info()
+    sessions = [('alice', 10.0, running), ('alice', 20.0, walking),
+                ('bob', 30.0, running), ('alice', 40.0, running)]
+    with homework.SessionStore(str(tmp_path / 'sessions.db')) as store:
+        assert store.add_many(sessions, chunk_size=3) == 4
+        assert list(store.query(user='alice', training_type='Running')) == [
+            ('alice', 10.0, running), ('alice', 40.0, running)
+        ]
+        assert list(store.query(start=20, end=40)) == sessions[1:3]
+        totals = store.aggregate(training_type='Running', start=0, end=35)
+        expected = homework.Totals()
+        expected.add(running)
+        expected.add(running)
+        assert totals == expected, (
+            'Агрегаты хранилища должны совпадать с инкрементальными.'
+        )
+        assert store.aggregate(user='nobody').count == 0
+
+
+def test_cli_profile(tmp_path):
+    report_path = tmp_path / 'profile.json'
+    with Capturing() as output:
+        status = homework.cli(['--profile', str(report_path), '--top', '0',
+                               '-p', 'RUN,15000,1,75',
+                               '-p', 'WLK,9000,1,75,180'])
+    assert status == 0
+    assert len(output) == 2
+    with open(report_path) as stream:
+        report = json.load(stream)
+    assert report['packages'] == 2
+    profiled = {row['function'] for row in report['cpu']}
+    for name in ['read_package', 'Training.show_training_info',
+                 'Running._spent_calories',
+                 'SportsWalking._spent_calories',
+                 'InfoMessage.get_message']:
+        assert name in profiled, (
+            f'Отчёт профилировщика должен содержать {name}.'
+        )
+    assert {row['function'] for row in report['memory']} & profiled
+
+    def retained_blocks(window):
+        report = homework.profile_packages(
+            [('RUN', [15000 + index, 1, 75]) for index in range(200)],
+            sink=lambda message: None, top=0, window=window
+        )
+        assert report['packages'] == 200
+        assert report['retained'] == min(window, 200)
+        return sum(row['blocks'] for row in report['memory']
+                   if row['function'] != 'other')
+
+    assert retained_blocks(5) * 5 < retained_blocks(200), (
+        'Профилировщик должен удерживать только окно последних пакетов.'
+    )
+
+
+def test_SharedPackageRing():
+    packages = [('SWM', [720, 1, 80, 25, 40]), ('RUN', [15000, 1, 75]),
+                ('WLK', [9000, 1, 75, 180]), ('RUN', [1206, 12, 6])] * 3
+    expected = [homework.read_package(*package).show_training_info()
+                for package in packages]
+    ring = homework.SharedPackageRing(capacity=8)
+    try:
+        assert ring.put_many(packages[:8]) == 8
+        with pytest.raises(homework.PackageError):
+            ring.put_many([('RUN', [1, 2])])
+        with pytest.raises(homework.PackageError):
+            ring.put_many([('RUN', [15000, 0, 75])])
+        with pytest.raises(homework.PackageError):
+            ring.put_many([('RUN', [float('inf'), 1, 75])])
+        ring.compute(ring.claim(5))
+        ring.compute(ring.claim(5))
+        assert ring.collect() == expected[:8]
+        ring.put_many(packages[8:])
+        ring.close_input()
+        assert ring.run_worker(batch=3) == 4
+        assert ring.collect() == expected[8:], (
+            'Результаты из общей памяти должны совпадать с расчётом '
+            'по объектам.'
+        )
+    finally:
+        ring.close()
+
+    fractional = ('RUN', [15000.6, 1, 75])
+    ring = homework.SharedPackageRing(capacity=1)
+    try:
+        ring.put_many([fractional])
+        ring.compute(ring.claim())
+        assert ring.collect() == [
+            homework.read_package(*fractional).show_training_info()
+        ], 'Дробные значения не должны округляться в общей памяти.'
+    finally:
+        ring.close()
+
+
+def test_SharedPackageRing_workers():
+    import multiprocessing
+
+    packages = [('RUN', [1000 + index, 1, 75]) for index in range(500)]
+    ring = homework.SharedPackageRing(capacity=64)
+    workers = [multiprocessing.Process(target=ring.run_worker,
+                                       kwargs={'batch': 16})
+               for _ in range(2)]
+    try:
+        for worker in workers:
+            worker.start()
+        results = []
+        deadline = time.monotonic() + 30
+        for chunk in homework._chunked(packages, 32):
+            ring.put_many(chunk)
+            while len(results) < packages.index(chunk[-1]) + 1 - 32:
+                assert time.monotonic() < deadline, 'Обработчики зависли.'
+                results.extend(ring.collect())
+        ring.close_input()
+        while len(results) < len(packages):
+            assert time.monotonic() < deadline, 'Обработчики зависли.'
+            results.extend(ring.collect())
+        for worker in workers:
+            worker.join(10)
+            assert worker.exitcode == 0
+    finally:
+        ring.close()
+    assert results == [homework.read_package(*package).show_training_info()
+                       for package in packages]